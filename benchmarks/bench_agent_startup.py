@@ -0,0 +1,62 @@
+"""Agent cold start: import plus Agent(...) time, peak RSS and heavy modules loaded.
+
+Every run is a fresh interpreter, so nothing is warm. `--eager` also touches every
+sub-agent and cached resource right after construction, which is what Agent.__init__ used
+to do. Run from the repo root in the full environment (the configured database is opened,
+nothing is written):
+
+    python -m benchmarks.bench_agent_startup --runs 5 --model gpt-4o --search-engine bing [--eager]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["tiktoken", "playwright", "keybert", "sentence_transformers", "torch", "fitz",
+                 "src.browser", "src.research", "src.bert.embedding_service", "src.context"]
+EAGER_ATTRIBUTES = ["planner", "researcher", "formatter", "coder", "action", "internal_monologue", "answer",
+                    "runner", "feature", "patcher", "reporter", "decision", "tokenizer", "context_builder",
+                    "browser_pool", "research_loop", "research_cache"]
+
+CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+from src.agents.agent import Agent
+imported = time.perf_counter()
+agent = Agent(base_model=sys.argv[1], search_engine=sys.argv[2])
+for name in json.loads(sys.argv[4]):
+    getattr(agent, name)
+built = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - started,
+    "init_s": built - imported,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "loaded": [name for name in json.loads(sys.argv[3]) if name in sys.modules],
+}))
+"""
+
+
+def cold_start(model: str, search_engine: str, eager: bool) -> dict:
+    attributes = EAGER_ATTRIBUTES if eager else []
+    output = subprocess.run([sys.executable, "-c", CHILD, model, search_engine, json.dumps(HEAVY_MODULES),
+                             json.dumps(attributes)], stdout=subprocess.PIPE, check=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--search-engine", default="bing")
+    parser.add_argument("--eager", action="store_true", help="build everything up front, as before")
+    args = parser.parse_args()
+
+    runs = [cold_start(args.model, args.search_engine, args.eager) for _ in range(args.runs)]
+    for key, unit in (("import_s", "s"), ("init_s", "s"), ("rss_mb", " MB")):
+        print(f"{key:8s}: median {statistics.median(run[key] for run in runs):.2f}{unit}")
+    print(f"heavy modules loaded: {sorted(set().union(*(run['loaded'] for run in runs))) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
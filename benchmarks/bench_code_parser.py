@@ -0,0 +1,64 @@
+"""Parser throughput on multi-MB responses, one-shot and streamed, in both formats.
+
+A linear parser keeps the MB/s column flat as the size grows. The "long line" case is one minified line in one file, which used to make the
+streaming parser quadratic. Run from the repo root:
+
+    python -m benchmarks.bench_code_parser --sizes-mb 1 2 4 --chunk-chars 32
+"""
+import argparse
+import json
+import time
+
+from src.code_parser import FilesStreamParser, parse_files
+
+FILE_CHARS = 20000
+
+
+def file_blocks(size: int) -> str:
+    line = "const value = compute(value); // keep going\n"
+    body = line * (FILE_CHARS // len(line))
+    blocks = [f"File: `src/module_{n}.js`:\n```js\n{body}```\n" for n in range(max(1, size // FILE_CHARS))]
+    return "~~~\n" + "\n".join(blocks) + "~~~\n"
+
+
+def json_files(size: int) -> str:
+    body = "const value = compute(value); // keep going\n" * (FILE_CHARS // 44)
+    files = [{"file": f"src/module_{n}.js", "code": body} for n in range(max(1, size // FILE_CHARS))]
+    return "~~~\n" + json.dumps(files) + "\n~~~\n"
+
+
+def long_line(size: int) -> str:
+    return "~~~\nFile: `dist/app.min.js`:\n```js\n" + "a=b+c;" * (size // 6) + "\n```\n~~~\n"
+
+
+def one_shot(text: str, chunk_chars: int) -> int:
+    return len(parse_files(text))
+
+
+def streamed(text: str, chunk_chars: int) -> int:
+    parser = FilesStreamParser()
+    count = 0
+    for start in range(0, len(text), chunk_chars):
+        count += len(parser.feed(text[start:start + chunk_chars]))
+    return count + len(parser.close())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--chunk-chars", type=int, default=32)
+    args = parser.parse_args()
+
+    for format_name, make in (("file blocks", file_blocks), ("json", json_files), ("long line", long_line)):
+        for size_mb in args.sizes_mb:
+            text = make(int(size_mb * 1024 * 1024))
+            for mode_name, parse in (("one-shot", one_shot), ("streamed", streamed)):
+                started = time.perf_counter()
+                count = parse(text, args.chunk_chars)
+                elapsed = time.perf_counter() - started
+                print(f"{format_name:11s} {size_mb:4.1f} MB {mode_name:8s}: {elapsed:6.3f}s "
+                      f"({len(text) / 1e6 / elapsed:6.1f} MB/s, {count} files)")
+
+
+if __name__ == "__main__":
+    main()
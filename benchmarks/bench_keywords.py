@@ -0,0 +1,85 @@
+"""Keyword extraction sentences/s: one KeyBERT per sentence vs the shared EmbeddingService.
+
+By default both sides use KeyBERT's default sentence-transformers model. `--stand-in-ms`
+swaps in a deterministic embedder that costs that many milliseconds per text, for
+machines without the model weights. Run from the repo root:
+
+    python -m benchmarks.bench_keywords --sentences 200 --batch 16 [--stand-in-ms 2]
+"""
+import argparse
+import hashlib
+import random
+import time
+
+import numpy as np
+from keybert import KeyBERT
+from keybert.backend import BaseEmbedder
+
+from src.bert.embedding_service import DIVERSITY, KEYPHRASE_NGRAM_RANGE, STOP_WORDS, TOP_N, EmbeddingService
+
+WORDS = ["build", "flask", "api", "login", "page", "database", "schema", "react", "button", "deploy",
+         "docker", "test", "cache", "search", "upload", "image", "resize", "email", "queue", "worker",
+         "payment", "stripe", "webhook", "chart", "dashboard", "export", "csv", "parser", "token", "auth"]
+
+
+class StandInEmbedder(BaseEmbedder):
+    def __init__(self, cost_ms: float, dimensions: int = 384):
+        super().__init__()
+        self.cost = cost_ms / 1000
+        self.dimensions = dimensions
+
+    def embed(self, documents, verbose=False) -> np.ndarray:
+        time.sleep(self.cost * len(documents))
+        seeds = [int.from_bytes(hashlib.sha256(document.encode()).digest()[:4], "little") for document in documents]
+        return np.stack([np.random.default_rng(seed).standard_normal(self.dimensions) for seed in seeds])
+
+
+def new_keybert(stand_in_ms: float) -> KeyBERT:
+    return KeyBERT(model=StandInEmbedder(stand_in_ms)) if stand_in_ms else KeyBERT()
+
+
+def make_sentences(count: int) -> list:
+    rng = random.Random(0)
+    return [f"Please {' '.join(rng.choices(WORDS, k=10))}" for _ in range(count)]
+
+
+def model_per_sentence(sentences: list, batch: int, stand_in_ms: float):
+    for sentence in sentences:
+        new_keybert(stand_in_ms).extract_keywords(sentence, keyphrase_ngram_range=KEYPHRASE_NGRAM_RANGE,
+                                                  stop_words=STOP_WORDS, top_n=TOP_N, use_mmr=True,
+                                                  diversity=DIVERSITY)
+
+
+def shared_service(service: EmbeddingService):
+    def run(sentences: list, batch: int, stand_in_ms: float):
+        for start in range(0, len(sentences), batch):
+            service.extract_keywords_many(sentences[start:start + batch])
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sentences", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--stand-in-ms", type=float, default=0, help="per-text cost of the stand-in embedder")
+    args = parser.parse_args()
+
+    sentences = make_sentences(args.sentences)
+    service = EmbeddingService()
+    if args.stand_in_ms:
+        service._model = new_keybert(args.stand_in_ms)
+    service.load()
+
+    runs = (
+        ("one model per sentence", model_per_sentence),
+        ("shared service, cold", shared_service(service)),
+        ("shared service, warm", shared_service(service)),
+    )
+    for name, run in runs:
+        started = time.perf_counter()
+        run(sentences, args.batch, args.stand_in_ms)
+        print(f"{name:23s}: {len(sentences) / (time.perf_counter() - started):7.1f} sentences/s")
+
+
+if __name__ == "__main__":
+    main()
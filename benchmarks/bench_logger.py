@@ -0,0 +1,80 @@
+"""Logger per-call overhead: fastlogging with a flush per call vs the queued Logger.
+
+The old Logger called fastlogging and flushed on every call. The queued Logger only
+enqueues; its writer thread formats, writes and flushes in batches. Console output goes
+to /dev/null while timing, and log files go to a temp dir. Run from the repo root:
+
+    python -m benchmarks.bench_logger --messages 20000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from fastlogging import LogInit
+
+from src.logger import Logger
+
+
+@contextmanager
+def quiet_stdout():
+    sys.stdout.flush()
+    saved = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(devnull)
+        os.close(saved)
+
+
+def flush_per_call(log_dir: str, messages: int, console: bool) -> float:
+    logger = LogInit(pathName=os.path.join(log_dir, f"old-{console}.log"), console=console, colors=True,
+                     encoding="utf-8")
+    started = time.perf_counter()
+    for n in range(messages):
+        logger.info(f"Processed step {n} of the plan")
+        logger.flush()
+    return (time.perf_counter() - started) / messages
+
+
+def queued(log_dir: str, messages: int, payload: str = None) -> tuple:
+    logger = Logger(os.path.join(log_dir, "queued.log"))
+    started = time.perf_counter()
+    for n in range(messages):
+        if payload is None:
+            logger.info("Processed step %s of the plan", n)
+        else:
+            logger.debug("Model response: %s", payload)
+    enqueued = time.perf_counter()
+    logger.flush()
+    return (enqueued - started) / messages, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--payload-mb", type=float, default=1, help="size of the large debug payload")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        with quiet_stdout():
+            old = flush_per_call(log_dir, args.messages, console=False)
+            old_console = flush_per_call(log_dir, args.messages, console=True)
+            per_call, total = queued(log_dir, args.messages)
+            payload_per_call, payload_total = queued(log_dir, 100, "x" * int(args.payload_mb * 1024 * 1024))
+
+    print(f"flush per call            : {old * 1e6:6.1f} us/call")
+    print(f"flush per call, console   : {old_console * 1e6:6.1f} us/call")
+    print(f"queued Logger             : {per_call * 1e6:6.1f} us/call, {total:.2f}s until written")
+    print(f"{f'queued Logger, {args.payload_mb:g} MB debug':26s}: {payload_per_call * 1e6:6.1f} us/call, "
+          f"{payload_total:.2f}s for 100 until written")
+
+
+if __name__ == "__main__":
+    main()
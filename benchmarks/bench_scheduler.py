@@ -0,0 +1,67 @@
+"""Agent job throughput: running jobs one after another vs the AgentScheduler pool.
+
+Each job is a mock agent run: a few stages, each a sleeping stand-in for an LLM call,
+with check_cancelled() between them as in Agent.execute. Job statuses are kept in memory
+so the benchmark leaves the configured database alone. Run from the repo root:
+
+    python -m benchmarks.bench_scheduler --projects 1 4 --jobs-per-project 2 --workers 4
+"""
+import argparse
+import time
+
+from src.scheduler import AgentScheduler, check_cancelled
+
+
+class InMemoryStatusScheduler(AgentScheduler):
+    def __init__(self, max_workers: int):
+        super().__init__(max_workers)
+        self.statuses = {}
+
+    def _publish(self, job):
+        with self._publish_lock:
+            self.statuses[job.id] = job.to_dict()
+
+
+def mock_agent_run(stages: int, stage_seconds: float):
+    for _ in range(stages):
+        time.sleep(stage_seconds)
+        check_cancelled()
+
+
+def serial(projects: int, jobs_per_project: int, workers: int, stages: int, stage_seconds: float) -> float:
+    started = time.perf_counter()
+    for _ in range(projects * jobs_per_project):
+        mock_agent_run(stages, stage_seconds)
+    return time.perf_counter() - started
+
+
+def scheduled(projects: int, jobs_per_project: int, workers: int, stages: int, stage_seconds: float) -> float:
+    scheduler = InMemoryStatusScheduler(workers)
+    started = time.perf_counter()
+    jobs = [scheduler.submit(f"project-{project}", mock_agent_run, stages, stage_seconds)
+            for _ in range(jobs_per_project) for project in range(projects)]
+    for job in jobs:
+        job.wait()
+    elapsed = time.perf_counter() - started
+    scheduler.shutdown()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--projects", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--jobs-per-project", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--stages", type=int, default=4)
+    parser.add_argument("--stage-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    for projects in args.projects:
+        timings = [run(projects, args.jobs_per_project, args.workers, args.stages, args.stage_ms / 1000)
+                   for run in (serial, scheduled)]
+        print(f"{projects} project(s) x {args.jobs_per_project} jobs: "
+              f"{timings[0]:5.2f}s serial, {timings[1]:5.2f}s scheduled ({args.workers} workers)")
+
+
+if __name__ == "__main__":
+    main()
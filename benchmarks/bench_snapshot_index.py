@@ -0,0 +1,99 @@
+"""Project code markdown: re-reading every file vs ProjectSnapshotIndex refreshes.
+
+Builds a synthetic project, then times reading the whole tree into markdown as before
+the index, and the index's cold build, unchanged refresh, refresh after one edit and
+one delete, and reload from the database with an empty in-memory cache. Run from the
+repo root:
+
+    python -m benchmarks.bench_snapshot_index --files 5000
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from src.database import get_engine
+from src.filesystem.snapshot import ProjectSnapshotIndex, file_markdown
+from src.logger import Logger
+
+PROJECT = "bench"
+
+
+class StandInProjectManager:
+    def __init__(self, project_path: str):
+        self.project_path = project_path
+
+    def get_project_path(self, project: str) -> str:
+        return self.project_path
+
+
+def make_project(root: str, files: int):
+    rng = random.Random(0)
+    words = ["def", "return", "value", "compute", "self", "import", "class", "for", "in", "if"]
+    for n in range(files):
+        path = os.path.join(root, "src", f"package_{n % 50}", f"module_{n}.py")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write("\n".join(" ".join(rng.choices(words, k=12)) for _ in range(rng.randint(20, 200))))
+
+
+def read_every_file(project_path: str) -> str:
+    """Assembling the code markdown as it was done before the index."""
+    fragments = []
+    for root, _, names in os.walk(project_path):
+        for name in names:
+            path = os.path.join(root, name)
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                fragments.append(file_markdown(os.path.relpath(path, project_path), f.read()))
+    return "".join(fragments)
+
+
+def make_index(db_path: str, project_path: str) -> ProjectSnapshotIndex:
+    # Skips the singleton so each instance starts with an empty in-memory cache.
+    index = object.__new__(ProjectSnapshotIndex)
+    index.engine = get_engine(db_path)
+    index.project_manager = StandInProjectManager(project_path)
+    index.logger = Logger()
+    index._lock = threading.Lock()
+    index._projects = {}
+    return index
+
+
+def timed(run) -> float:
+    started = time.perf_counter()
+    run()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        project_path = os.path.join(temp_dir, "project")
+        make_project(project_path, args.files)
+        db_path = os.path.join(temp_dir, "devika.db")
+        index = make_index(db_path, project_path)
+
+        def edit_and_delete():
+            with open(os.path.join(project_path, "src", "package_0", "module_0.py"), "a") as f:
+                f.write("\nvalue = compute(value)")
+            os.remove(os.path.join(project_path, "src", "package_1", "module_1.py"))
+            index.code_set_to_markdown(PROJECT)
+
+        runs = (
+            ("read every file", lambda: read_every_file(project_path)),
+            ("index, cold build", lambda: index.code_set_to_markdown(PROJECT)),
+            ("index, unchanged", lambda: index.code_set_to_markdown(PROJECT)),
+            ("index, edit + delete", edit_and_delete),
+            ("index, reload from db", lambda: make_index(db_path, project_path).code_set_to_markdown(PROJECT)),
+        )
+        for name, run in runs:
+            print(f"{name:22s}: {timed(run):6.3f}s")
+
+
+if __name__ == "__main__":
+    main()
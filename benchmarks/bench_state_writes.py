@@ -0,0 +1,77 @@
+"""State writes per second: a new engine per store vs the shared pooled WAL engine.
+
+Before the shared engine, every AgentState() built its own engine and ran create_all,
+and the coding agents built one per written file. Run from the repo root:
+
+    python -m benchmarks.bench_state_writes --writes 500 --threads 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from sqlmodel import Field, Session, SQLModel, create_engine
+
+from src.database import get_engine
+
+
+class BenchStateEntry(SQLModel, table=True):
+    __tablename__ = "bench_state_entry"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    project: str
+    state_json: str
+
+
+STATE = json.dumps({"internal_monologue": "Writing code...", "terminal_session": {"title": "main.py"}})
+
+
+def write(engine, project: str):
+    with Session(engine) as session:
+        session.add(BenchStateEntry(project=project, state_json=STATE))
+        session.commit()
+
+
+def per_call_engine(db_path: str, project: str, writes: int):
+    for _ in range(writes):
+        engine = create_engine(f"sqlite:///{db_path}")
+        SQLModel.metadata.create_all(engine)
+        write(engine, project)
+        engine.dispose()
+
+
+def shared_engine(db_path: str, project: str, writes: int):
+    engine = get_engine(db_path)
+    for _ in range(writes):
+        write(engine, project)
+
+
+def run(pattern, db_path: str, writes: int, threads: int) -> float:
+    workers = [threading.Thread(target=pattern, args=(db_path, f"project-{n}", writes)) for n in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return writes * threads / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writes", type=int, default=500, help="writes per thread")
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for threads in sorted({1, args.threads}):
+            for name, pattern in (("per-call engine", per_call_engine), ("shared engine", shared_engine)):
+                db_path = os.path.join(temp_dir, f"{name.replace(' ', '-')}-{threads}.db")
+                rate = run(pattern, db_path, args.writes, threads)
+                print(f"{threads} thread(s), {name:15s}: {rate:8.0f} writes/s")
+
+
+if __name__ == "__main__":
+    main()
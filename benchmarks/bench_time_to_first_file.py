@@ -0,0 +1,92 @@
+"""Time to first file on screen: the coder's state deltas with a streamed vs a parsed-at-end completion.
+
+A stand-in LLM produces a multi-file response at a fixed rate, so the numbers depend
+only on response size and generation speed. What is timed is what the user sees: the
+first "agent-state" delta leaving the socket emitter, and the files landing on disk.
+Run from the repo root:
+
+    python -m benchmarks.bench_time_to_first_file --files 8 --file-chars 1500 --chars-per-second 4000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from src.agents.coder.coder import Coder
+from src.code_parser import parse_files
+from src.config import Config
+from src.logger import Logger
+from src.socket_instance import emitter
+
+CHUNK_CHARS = 16
+
+
+def make_response(files: int, file_chars: int) -> str:
+    line = "    value = compute(value)  # keep going\n"
+    body = (line * (file_chars // len(line) + 1))[:file_chars]
+    blocks = [f"File: `src/module_{n}.py`:\n```python\n{body}\n```\n" for n in range(files)]
+    return "~~~\n" + "\n".join(blocks) + "~~~\n"
+
+
+class StandInLLM:
+    def __init__(self, response: str, chars_per_second: float):
+        self.response = response
+        self.chunk_delay = CHUNK_CHARS / chars_per_second
+
+    def stream_inference(self, prompt: str, project_name: str):
+        for start in range(0, len(self.response), CHUNK_CHARS):
+            time.sleep(self.chunk_delay)
+            yield self.response[start:start + CHUNK_CHARS]
+
+    def inference(self, prompt: str, project_name: str) -> str:
+        return "".join(self.stream_inference(prompt, project_name))
+
+
+def make_coder(llm, projects_dir: str) -> Coder:
+    # Skips Coder.__init__, which would build a real model client.
+    coder = object.__new__(Coder)
+    coder.config = Config()
+    coder.project_dir = projects_dir
+    coder.logger = Logger()
+    coder.llm = llm
+    return coder
+
+
+def parsed_at_end(coder: Coder, project_name: str):
+    files = parse_files(coder.llm.inference("prompt", project_name))
+    coder.save_code_to_project(files, project_name)
+
+
+def streamed(coder: Coder, project_name: str):
+    coder.stream_code_to_project("prompt", project_name)
+
+
+def run(write, coder: Coder, project_name: str) -> tuple:
+    sent = []
+    emitter.send = lambda channel, content: sent.append((time.perf_counter(), channel))
+    started = time.perf_counter()
+    write(coder, project_name)
+    on_disk = time.perf_counter() - started
+    emitter.flush()
+    deltas = [at - started for at, channel in sent if channel == "agent-state"]
+    return deltas[0], on_disk, len(deltas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--file-chars", type=int, default=1500)
+    parser.add_argument("--chars-per-second", type=float, default=4000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        Config.get_sqlite_db = lambda self: os.path.join(tmp, "devika.db")
+        coder = make_coder(StandInLLM(make_response(args.files, args.file_chars), args.chars_per_second), tmp)
+        for name, write in (("parse at end", parsed_at_end), ("streamed", streamed)):
+            first, on_disk, count = run(write, coder, f"bench {name}")
+            print(f"{name:12s}: first delta after {first:5.2f}s, files on disk after {on_disk:5.2f}s, "
+                  f"{count} deltas")
+
+
+if __name__ == "__main__":
+    main()
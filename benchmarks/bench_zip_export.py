@@ -0,0 +1,85 @@
+"""Project zip export: the old serial zipfile writer vs ZipExporter, with peak memory.
+
+Builds a synthetic project of source files, already-compressed images and one large log,
+then times each exporter; peak memory is Python allocations as seen by tracemalloc. Run
+from the repo root:
+
+    python -m benchmarks.bench_zip_export --text-files 1000 --images 10 --log-mb 20
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+from src.filesystem.archive import ZipExporter
+
+
+def make_project(root: str, text_files: int, images: int, log_mb: int):
+    rng = random.Random(0)
+    words = ["def", "return", "value", "compute", "self", "import", "class", "for", "in", "if"]
+    for n in range(text_files):
+        path = os.path.join(root, "src", f"package_{n % 20}", f"module_{n}.py")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write("\n".join(" ".join(rng.choices(words, k=12)) for _ in range(rng.randint(20, 400))))
+    os.makedirs(os.path.join(root, "assets"), exist_ok=True)
+    for n in range(images):
+        with open(os.path.join(root, "assets", f"image_{n}.png"), "wb") as f:
+            f.write(os.urandom(2 * 1024 * 1024))
+    with open(os.path.join(root, "build.log"), "w") as f:
+        line = "2026-01-01 00:00:00 INFO step finished without errors\n"
+        f.write(line * (log_mb * 1024 * 1024 // len(line)))
+
+
+def serial_zipfile(project_path: str, zip_path: str):
+    """project_to_zip as it was before ZipExporter."""
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
+        for root, dirs, files in os.walk(project_path):
+            for file in files:
+                relative_path = os.path.relpath(os.path.join(root, file), os.path.join(project_path, ".."))
+                zipf.write(os.path.join(root, file), arcname=relative_path)
+
+
+def exporter(project_path: str, zip_path: str):
+    ZipExporter().export(project_path, zip_path)
+
+
+def measure(export, project_path: str, zip_path: str) -> tuple:
+    tracemalloc.start()
+    started = time.perf_counter()
+    export(project_path, zip_path)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, os.path.getsize(zip_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--text-files", type=int, default=1000)
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--log-mb", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        project_path = os.path.join(temp_dir, "project")
+        make_project(project_path, args.text_files, args.images, args.log_mb)
+        size = sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(project_path) for name in names)
+        print(f"project: {size / 1e6:.0f} MB, {os.cpu_count()} CPUs")
+
+        runs = (
+            ("serial zipfile", serial_zipfile, "serial.zip"),
+            ("ZipExporter", exporter, "exporter.zip"),
+            ("ZipExporter, unchanged", exporter, "exporter.zip"),
+        )
+        for name, export, zip_name in runs:
+            elapsed, peak, zip_size = measure(export, project_path, os.path.join(temp_dir, zip_name))
+            print(f"{name:22s}: {elapsed:6.2f}s, peak {peak / 1e6:5.1f} MB, zip {zip_size / 1e6:5.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
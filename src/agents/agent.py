@@ -1,102 +1,150 @@
+import importlib
 import json
 import platform
 import time
-import asyncio
+from functools import cached_property
+from typing import TYPE_CHECKING
 
 from src.socket_instance import emit_agent
-from src.browser import Browser, start_interaction
 from src.project import ProjectManager
 from src.state import AgentState
 from src.logger import Logger
-from src.bert.sentence import SentenceBert
-from src.memory import KnowledgeBase
-from src.services import Netlify
-from src.documenter.pdf import PDF
-from src.filesystem import ReadCode
-from src.browser.search import BingSearch, GoogleSearch, DuckDuckGoSearch
-from src.planner import Planner
-from src.researcher import Researcher
-from src.formatter import Formatter
-from src.coder import Coder
-from src.action import Action
-from src.internal_monologue import InternalMonologue
-from src.answer import Answer
-from src.runner import Runner
-from src.feature import Feature
-from src.patcher import Patcher
-from src.reporter import Reporter
-from src.decision import Decision
-import tiktoken
+from src.retry import retry_controller
+from src.scheduler import check_cancelled
+from src.stages import Stage, StageGraph
+from src.keywords import ProjectKeywords
+
+if TYPE_CHECKING:
+    from src.browser import Browser
+
+# Browser automation, embeddings, PDF rendering, deployment and search clients are
+# imported where they are used, so an Agent that only answers questions never loads them.
+
+RESEARCH_CONCURRENCY = 4
+# Which context budget each follow-up action is built with.
+ACTION_CONTEXT_AGENTS = {
+    "answer": "answer",
+    "run": "runner",
+    "feature": "feature",
+    "bug": "patcher",
+    "report": "reporter",
+}
+
+
+class lazy_agent:
+    """Sub-agent attribute that imports and builds the agent on first access."""
+
+    def __init__(self, module: str, class_name: str):
+        self.module = module
+        self.class_name = class_name
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        agent_class = getattr(importlib.import_module(self.module), self.class_name)
+        sub_agent = agent_class(base_model=instance.base_model)
+        instance.__dict__[self.name] = sub_agent
+        return sub_agent
 
 
 class Agent:
-    def __init__(self, base_model: str, search_engine: str, browser: Browser = None):
+    planner = lazy_agent("src.planner", "Planner")
+    researcher = lazy_agent("src.researcher", "Researcher")
+    formatter = lazy_agent("src.formatter", "Formatter")
+    coder = lazy_agent("src.coder", "Coder")
+    action = lazy_agent("src.action", "Action")
+    internal_monologue = lazy_agent("src.internal_monologue", "InternalMonologue")
+    answer = lazy_agent("src.answer", "Answer")
+    runner = lazy_agent("src.runner", "Runner")
+    feature = lazy_agent("src.feature", "Feature")
+    patcher = lazy_agent("src.patcher", "Patcher")
+    reporter = lazy_agent("src.reporter", "Reporter")
+    decision = lazy_agent("src.decision", "Decision")
+
+    def __init__(self, base_model: str, search_engine: str, browser: "Browser" = None):
         if not base_model:
             raise ValueError("base_model is required")
 
         self.logger = Logger()
+        self.base_model = base_model
 
-        self.collected_context_keywords = []
-        self.planner = Planner(base_model=base_model)
-        self.researcher = Researcher(base_model=base_model)
-        self.formatter = Formatter(base_model=base_model)
-        self.coder = Coder(base_model=base_model)
-        self.action = Action(base_model=base_model)
-        self.internal_monologue = InternalMonologue(base_model=base_model)
-        self.answer = Answer(base_model=base_model)
-        self.runner = Runner(base_model=base_model)
-        self.feature = Feature(base_model=base_model)
-        self.patcher = Patcher(base_model=base_model)
-        self.reporter = Reporter(base_model=base_model)
-        self.decision = Decision(base_model=base_model)
-
+        self.context_keywords = ProjectKeywords()
         self.project_manager = ProjectManager()
         self.agent_state = AgentState()
         self.engine = search_engine
-        self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        self.last_stage_report = None
+
+    @cached_property
+    def tokenizer(self):
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+
+    @cached_property
+    def context_builder(self):
+        from src.context import ContextBuilder
+        return ContextBuilder(self.tokenizer)
+
+    @cached_property
+    def research_loop(self):
+        from src.research import EventLoopThread
+        return EventLoopThread()
+
+    @cached_property
+    def browser_pool(self):
+        from src.browser.pool import BrowserPool
+        browser_pool = BrowserPool(max_pages=RESEARCH_CONCURRENCY)
+        browser_pool.start(self.research_loop.loop)
+        return browser_pool
+
+    @cached_property
+    def research_cache(self):
+        from src.research import ResearchCache
+        return ResearchCache()
 
     async def open_page(self, project_name, pdf_download_url):
-        browser = await Browser().start()
-        await browser.go_to(pdf_download_url)
-        _, raw = await browser.screenshot(project_name)
-        data = await browser.extract_text()
-        await browser.close()
-        return browser, raw, data
+        async with self.browser_pool.page() as page:
+            await page.go_to(pdf_download_url)
+            _, raw = await page.screenshot(project_name)
+            data = await page.extract_text()
+        return raw, data
 
-    def search_queries(self, queries: list, project_name: str) -> dict:
-        results = {}
-        knowledge_base = KnowledgeBase()
+    def new_web_search(self):
+        from src.browser.search import BingSearch, GoogleSearch, DuckDuckGoSearch
 
         if self.engine == "bing":
-            web_search = BingSearch()
+            return BingSearch()
         elif self.engine == "google":
-            web_search = GoogleSearch()
-        else:
-            web_search = DuckDuckGoSearch()
-
-        self.logger.info(f"Search Engine :: {self.engine}")
+            return GoogleSearch()
+        return DuckDuckGoSearch()
 
-        for query in queries:
-            query = query.strip().lower()
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-            web_search.search(query)
-            link = web_search.get_first_link()
-            self.logger.info(f"Link :: {link}")
+    def search_queries(self, queries: list, project_name: str) -> dict:
+        from src.research import ResearchPipeline
 
-            browser, raw, data = loop.run_until_complete(self.open_page(project_name, link))
-            emit_agent("screenshot", {"data": raw, "project_name": project_name}, False)
-            results[query] = self.formatter.execute(data, project_name)
+        self.logger.info(f"Search Engine :: {self.engine}")
 
-            self.logger.info(f"Got search results for: {query}")
+        pipeline = ResearchPipeline(
+            new_search=self.new_web_search,
+            open_page=self.open_page,
+            format_text=self.formatter.execute,
+            concurrency=RESEARCH_CONCURRENCY,
+            on_screenshot=lambda raw, project: emit_agent("screenshot", {"data": raw, "project_name": project}, False),
+            cache=self.research_cache
+        )
+        results = self.research_loop.run(pipeline.run(queries, project_name))
+        self.logger.info(f"Research stage timings :: {pipeline.timings}")
+        self.logger.info(f"Research cache :: {self.research_cache.stats}")
 
         return results
 
-    def update_contextual_keywords(self, sentence: str):
-        keywords = SentenceBert(sentence).extract_keywords()
-        self.collected_context_keywords.extend(keyword[0] for keyword in keywords)
-        return self.collected_context_keywords
+    def update_contextual_keywords(self, sentence: str, project_name: str) -> list:
+        from src.bert.embedding_service import get_embedding_service
+
+        keywords = get_embedding_service().extract_keywords(sentence)
+        self.context_keywords.add(project_name, (keyword[0] for keyword in keywords))
+        return self.context_keywords.top_k(project_name)
 
     def make_decision(self, prompt: str, project_name: str) -> None:
         decision = self.decision.execute(prompt, project_name)
@@ -115,33 +163,38 @@ class Agent:
             elif function == "generate_pdf_document":
                 user_prompt = args["user_prompt"]
                 markdown = self.reporter.execute([user_prompt], "", project_name)
+                from src.documenter.pdf import PDF
                 _out_pdf_file = PDF().markdown_to_pdf(markdown, project_name)
                 self.project_manager.add_message_from_devika(project_name, f"PDF document generated.")
 
             elif function == "browser_interaction":
                 user_prompt = args["user_prompt"]
+                from src.browser import start_interaction
                 start_interaction(self.base_model, user_prompt, project_name)
 
             elif function == "coding_project":
                 user_prompt = args["user_prompt"]
-                plan = self.planner.execute(user_prompt, project_name)
-                research = self.researcher.execute(plan, self.collected_context_keywords, project_name)
-                search_results = self.search_queries(research["queries"], project_name)
-                code = self.coder.execute(step_by_step_plan=plan,
-                                          user_context=research["ask_user"],
-                                          search_results=search_results,
-                                          project_name=project_name)
-                self.coder.save_code_to_project(code, project_name)
+                self.run_stages([
+                    Stage("plan", lambda user_prompt, project_name: self.planner.execute(user_prompt, project_name),
+                          inputs=("user_prompt", "project_name")),
+                ] + self.coding_stages(), {"user_prompt": user_prompt, "project_name": project_name,
+                                           "keywords": self.context_keywords.top_k(project_name)})
 
     def subsequent_execute(self, prompt: str, project_name: str) -> None:
         os_system = platform.platform()
+        retry_controller.reset_budget(project_name)
         self.agent_state.set_agent_active(project_name, True)
 
-        conversation = self.project_manager.get_all_messages_formatted(project_name)
-        code_markdown = ReadCode(project_name).code_set_to_markdown()
+        messages = self.context_builder.recent_messages(project_name)
+        conversation = self.context_builder.build_conversation("action", prompt, messages)
 
         response, action = self.action.execute(conversation, project_name)
         self.project_manager.add_message_from_devika(project_name, response)
+        check_cancelled()
+
+        if action in ACTION_CONTEXT_AGENTS:
+            conversation, code_markdown = self.context_builder.build(ACTION_CONTEXT_AGENTS[action],
+                                                                     project_name, prompt, messages)
 
         if action == "answer":
             response = self.answer.execute(conversation=conversation,
@@ -158,6 +211,7 @@ class Agent:
                                 project_name=project_name)
 
         elif action == "deploy":
+            from src.services import Netlify
             deploy_metadata = Netlify().deploy(project_name)
             deploy_url = deploy_metadata["deploy_url"]
             response = {
@@ -167,25 +221,24 @@ class Agent:
             self.project_manager.add_message_from_devika(project_name, json.dumps(response, indent=4))
 
         elif action == "feature":
-            code = self.feature.execute(conversation=conversation,
-                                        code_markdown=code_markdown,
-                                        system_os=os_system,
-                                        project_name=project_name)
-            self.feature.save_code_to_project(code, project_name)
+            self.feature.execute(conversation=conversation,
+                                 code_markdown=code_markdown,
+                                 system_os=os_system,
+                                 project_name=project_name)
 
         elif action == "bug":
-            code = self.patcher.execute(conversation=conversation,
-                                        code_markdown=code_markdown,
-                                        commands=None,
-                                        error=prompt,
-                                        system_os=os_system,
-                                        project_name=project_name)
-            self.patcher.save_code_to_project(code, project_name)
+            self.patcher.execute(conversation=conversation,
+                                 code_markdown=code_markdown,
+                                 commands=None,
+                                 error=prompt,
+                                 system_os=os_system,
+                                 project_name=project_name)
 
         elif action == "report":
             markdown = self.reporter.execute(conversation,
                                              code_markdown,
                                              project_name)
+            from src.documenter.pdf import PDF
             _out_pdf_file = PDF().markdown_to_pdf(markdown, project_name)
             self.project_manager.add_message_from_devika(project_name, f"PDF document generated.")
 
@@ -194,32 +247,35 @@ class Agent:
         self.project_manager.add_message_from_devika(project_name,
                                                      "Task completed. Let me know if you need anything else.")
 
-    def execute(self, prompt: str, project_name_from_user: str = None) -> str:
-        if project_name_from_user:
-            self.project_manager.add_message_from_user(project_name_from_user, prompt)
-
+    def _plan(self, prompt: str, project_name_from_user: str):
         plan = self.planner.execute(prompt, project_name_from_user)
-        planner_response = self.planner.parse_response(plan)
+        return plan, self.planner.parse_response(plan)
 
+    def _open_project(self, prompt: str, planner_response: dict, project_name_from_user: str) -> tuple:
         if not project_name_from_user:
             project_name = planner_response["project"]
             self.project_manager.create_project(project_name)
             self.project_manager.add_message_from_user(project_name, prompt)
         else:
             project_name = project_name_from_user
+        retry_controller.reset_budget(project_name)
+
+        # The monologue is written into this entry when it is ready, so it keeps its place
+        # before the browsing and coding states that are appended concurrently.
+        monologue_index = self.agent_state.add_to_current_state(project_name, self.agent_state.new_state())
+        return project_name, monologue_index
 
-        reply = planner_response["reply"]
-        focus = planner_response["focus"]
-        self.update_contextual_keywords(focus)
+    def _keywords(self, planner_response: dict, project_name: str) -> list:
+        return self.update_contextual_keywords(planner_response["focus"], project_name)
 
+    def _internal_monologue(self, plan: str, project_name: str, monologue_index: int) -> str:
         internal_monologue = self.internal_monologue.execute(current_prompt=plan,
                                                              project_name=project_name)
-        new_state = self.agent_state.new_state()
-        new_state["internal_monologue"] = internal_monologue
-        self.agent_state.add_to_current_state(project_name, new_state)
+        self.agent_state.patch_state(project_name, monologue_index, {"internal_monologue": internal_monologue})
+        return internal_monologue
 
-        research = self.researcher.execute(plan, self.collected_context_keywords,
-                                           project_name=project_name)
+    def _research(self, plan: str, keywords: list, project_name: str) -> dict:
+        research = self.researcher.execute(plan, keywords, project_name=project_name)
         queries = research["queries"]
         queries_combined = ", ".join(queries) if queries else ""
         ask_user = research["ask_user"]
@@ -231,13 +287,48 @@ class Agent:
 
         if ask_user:
             self.project_manager.add_message_from_devika(project_name, ask_user)
+        return research
+
+    def _search(self, research: dict, project_name: str) -> dict:
+        queries = research["queries"]
+        return self.search_queries(queries, project_name) if queries else {}
 
-        search_results = self.search_queries(queries, project_name) if queries else {}
-        code = self.coder.execute(step_by_step_plan=plan,
-                                  user_context=ask_user,
+    def _code(self, plan: str, research: dict, search_results: dict, project_name: str) -> str:
+        return self.coder.execute(step_by_step_plan=plan,
+                                  user_context=research["ask_user"],
                                   search_results=search_results,
                                   project_name=project_name)
-        self.coder.save_code_to_project(code, project_name)
+
+    def coding_stages(self) -> list:
+        """Research, search and code; shared by `execute` and the coding_project decision."""
+        return [
+            Stage("research", self._research, inputs=("plan", "keywords", "project_name")),
+            Stage("search_results", self._search, inputs=("research", "project_name")),
+            Stage("code", self._code, inputs=("plan", "research", "search_results", "project_name")),
+        ]
+
+    def run_stages(self, stages: list, initial: dict) -> dict:
+        values, report = StageGraph(stages, initial).run(initial, between_stages=check_cancelled)
+        self.last_stage_report = report
+        self.logger.info(f"Stage report :: {report}")
+        return values
+
+    def execute(self, prompt: str, project_name_from_user: str = None) -> str:
+        if project_name_from_user:
+            self.project_manager.add_message_from_user(project_name_from_user, prompt)
+
+        # The monologue only needs the plan, so it runs next to research and search.
+        values = self.run_stages([
+            Stage("plan", self._plan, inputs=("prompt", "project_name_from_user"),
+                  outputs=("plan", "planner_response")),
+            Stage("project_name", self._open_project,
+                  inputs=("prompt", "planner_response", "project_name_from_user"),
+                  outputs=("project_name", "monologue_index")),
+            Stage("keywords", self._keywords, inputs=("planner_response", "project_name")),
+            Stage("internal_monologue", self._internal_monologue,
+                  inputs=("plan", "project_name", "monologue_index")),
+        ] + self.coding_stages(), {"prompt": prompt, "project_name_from_user": project_name_from_user})
+        project_name = values["project_name"]
 
         self.agent_state.set_agent_completed(project_name, True)
         self.project_manager.add_message_from_devika(project_name,
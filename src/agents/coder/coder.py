@@ -1,98 +1,94 @@
 import os
-import time
-from jinja2 import Environment, FileSystemLoader
-from typing import List, Dict, Union
+from typing import List, Dict, Tuple, Union
 from src.config import Config
-from src.llm import LLM
+from src.llm.clients import agent_llm
+from src.llm.stream import stream_files
+from src.code_parser import CodeParseError, FilesStreamParser, parse_files
 from src.state import AgentState
+from src.filesystem.writer import ProjectWriter, CHANGED
 from src.logger import Logger
+from src.prompts import render_prompt
+from src.retry import retry_controller
 
 class Coder:
     def __init__(self, base_model: str):
         self.config = Config()
         self.project_dir = self.config.get_projects_dir()
         self.logger = Logger()
-        self.llm = LLM(model_id=base_model)
-        self.env = Environment(loader=FileSystemLoader("src/agents/coder"))
+        self.llm = agent_llm(base_model, "coder")
 
     def render(self, step_by_step_plan: str, user_context: str, search_results: dict) -> str:
-        template = self.env.get_template("prompt.jinja2")
-        return template.render(
+        return render_prompt(
+            "coder",
             step_by_step_plan=step_by_step_plan,
             user_context=user_context,
             search_results=search_results,
         )
 
     def validate_response(self, response: str) -> Union[List[Dict[str, str]], bool]:
-        response = response.strip()
+        self.logger.debug("Response from the model: %s", response)
 
-        self.logger.debug(f"Response from the model: {response}")
-
-        if "~~~" not in response:
+        try:
+            result = parse_files(response)
+        except CodeParseError as e:
+            self.logger.warning(f"Invalid response from the model: {e}")
             return False
 
-        response = response.split("~~~", 1)[1]
-        response = response[:response.rfind("~~~")]
-        response = response.strip()
-
-        result = []
-        current_file = None
-        current_code = []
-        code_block = False
-
-        for line in response.split("\n"):
-            if line.startswith("File: "):
-                if current_file and current_code:
-                    result.append({"file": current_file, "code": "\n".join(current_code)})
-                current_file = line.split("`")[1].strip()
-                current_code = []
-                code_block = False
-            elif line.startswith("```"):
-                code_block = not code_block
-            elif not code_block and current_file:
-                current_code.append(line)
-
-        if current_file and current_code:
-            result.append({"file": current_file, "code": "\n".join(current_code)})
-
         return result if result else False
 
     def save_code_to_project(self, response: List[Dict[str, str]], project_name: str) -> str:
         project_path = os.path.join(self.project_dir, project_name.lower().replace(" ", "-"))
-        os.makedirs(project_path, exist_ok=True)
 
-        for file_data in response:
-            file_path = os.path.join(project_path, file_data["file"])
-            with open(file_path, "w") as f:
-                f.write(file_data["code"])
+        agent_state = AgentState()
+        current_state = agent_state.get_latest_state(project_name)
+
+        with agent_state.state_batch(project_name, pace_ms=self.config.code_writing_pace_ms) as batch, \
+                ProjectWriter(project_path, project_name) as writer:
+            for file_data in response:
+                if writer.write(file_data["file"], file_data["code"]) in CHANGED:
+                    batch.append(self.code_writing_state(agent_state, file_data, current_state))
 
         return project_path
 
-    def emulate_code_writing(self, code_set: List[Dict[str, str]], project_name: str):
-        current_state = AgentState().get_latest_state(project_name)
+    def stream_code_to_project(self, prompt: str, project_name: str) -> Tuple[str, Union[List[Dict[str, str]], bool]]:
+        """Stream the completion, staging every file as soon as the model has finished it.
 
-        for file_data in code_set:
-            file_name = file_data["file"]
-            code_content = file_data["code"]
+        Each file's state is shown right away as provisional. The staged files only land in
+        the project if the whole response parses; otherwise the files are discarded, the
+        states rolled back and the retry starts from a clean slate. Returns the response and
+        the parsed files, or False in their place.
+        """
+        project_path = os.path.join(self.project_dir, project_name.lower().replace(" ", "-"))
 
-            new_state = AgentState().new_state()
-            new_state["browser_session"] = current_state["browser_session"]
-            new_state["internal_monologue"] = "Writing code..."
-            new_state["terminal_session"]["title"] = f"Editing {file_name}"
-            new_state["terminal_session"]["command"] = f"vim {file_name}"
-            new_state["terminal_session"]["output"] = code_content
+        agent_state = AgentState()
+        current_state = agent_state.get_latest_state(project_name)
 
-            AgentState().add_to_current_state(project_name, new_state)
-            time.sleep(2)
+        with agent_state.state_batch(project_name, pace_ms=self.config.code_writing_pace_ms) as batch, \
+                ProjectWriter(project_path, project_name) as writer:
+            def save_file(file_data: Dict[str, str]):
+                if writer.write(file_data["file"], file_data["code"]) in CHANGED:
+                    batch.append(self.code_writing_state(agent_state, file_data, current_state))
 
-    def execute(self, step_by_step_plan: str, user_context: str, search_results: dict, project_name: str) -> str:
-        while True:
-            prompt = self.render(step_by_step_plan, user_context, search_results)
-            response = self.llm.inference(prompt, project_name)
-            valid_response = self.validate_response(response)
+            response, files = stream_files(self.llm, prompt, project_name, FilesStreamParser(), save_file)
+            self.logger.debug("Response from the model: %s", response)
+            if not files:
+                batch.discard()
+                writer.discard()
+            return response, files or False
+
+    def code_writing_state(self, agent_state: AgentState, file_data: Dict[str, str], current_state: dict) -> dict:
+        file_name = file_data["file"]
 
-            if valid_response:
-                self.emulate_code_writing(valid_response, project_name)
-                return valid_response
+        new_state = agent_state.new_state()
+        if current_state:
+            new_state["browser_session"] = current_state["browser_session"]
+        new_state["internal_monologue"] = "Writing code..."
+        new_state["terminal_session"]["title"] = f"Editing {file_name}"
+        new_state["terminal_session"]["command"] = f"vim {file_name}"
+        new_state["terminal_session"]["output"] = file_data["code"]
+        return new_state
 
-            print("Invalid response from the model, trying again...")
+    def execute(self, step_by_step_plan: str, user_context: str, search_results: dict, project_name: str) -> str:
+        prompt = self.render(step_by_step_plan, user_context, search_results)
+        return retry_controller.run("coder", project_name, prompt,
+                                    lambda attempt_prompt: self.stream_code_to_project(attempt_prompt, project_name))
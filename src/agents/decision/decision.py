@@ -1,15 +1,14 @@
 import json
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-from src.llm import LLM
+from src.llm.clients import agent_llm
+from src.retry import retry_controller
+from src.prompts import render_prompt
 
 class Decision:
     def __init__(self, base_model: str):
-        self.llm = LLM(model_id=base_model)
-        self.env = Environment(loader=FileSystemLoader("src/agents/decision"), autoescape=select_autoescape())
+        self.llm = agent_llm(base_model, "decision")
 
     def render(self, prompt: str) -> str:
-        template = self.env.get_template("prompt.jinja2")
-        return template.render(prompt=prompt)
+        return render_prompt("decision", prompt=prompt)
 
     def validate_response(self, response: str) -> bool:
         response = response.strip().replace("```json", "```")
@@ -31,11 +30,7 @@ class Decision:
         return True
 
     def execute(self, prompt: str, project_name: str) -> str:
-        while True:
-            rendered_prompt = self.render(prompt)
-            response = self.llm.inference(rendered_prompt, project_name)
-
-            if self.validate_response(response):
-                return response
-            else:
-                print("Invalid response from the model, trying again...")
+        rendered_prompt = self.render(prompt)
+        return retry_controller.run("decision", project_name, rendered_prompt,
+                                    lambda attempt_prompt: self.llm.inference(attempt_prompt, project_name),
+                                    lambda response: response if self.validate_response(response) else False)
@@ -1,14 +1,12 @@
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-from src.llm import LLM
+from src.llm.clients import agent_llm
+from src.prompts import render_prompt
 
 class Formatter:
     def __init__(self, base_model: str):
-        self.llm = LLM(model_id=base_model)
-        self.env = Environment(loader=FileSystemLoader("src/agents/formatter"), autoescape=select_autoescape())
+        self.llm = agent_llm(base_model, "formatter")
 
     def render(self, raw_text: str) -> str:
-        template = self.env.get_template("prompt.jinja2")
-        return template.render(raw_text=raw_text)
+        return render_prompt("formatter", raw_text=raw_text)
 
     def validate_response(self, response: str) -> bool:
         # Implement actual response validation logic here
@@ -1,15 +1,14 @@
 import json
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-from src.llm import LLM
+from src.llm.clients import agent_llm
+from src.retry import retry_controller
+from src.prompts import render_prompt
 
 class InternalMonologue:
     def __init__(self, base_model: str):
-        self.llm = LLM(model_id=base_model)
-        self.env = Environment(loader=FileSystemLoader("src/agents/internal_monologue"), autoescape=select_autoescape())
+        self.llm = agent_llm(base_model, "internal_monologue")
 
     def render(self, current_prompt: str) -> str:
-        template = self.env.get_template("prompt.jinja2")
-        return template.render(current_prompt=current_prompt)
+        return render_prompt("internal_monologue", current_prompt=current_prompt)
 
     def validate_response(self, response: str) -> str:
         try:
@@ -28,14 +27,10 @@ class InternalMonologue:
 
     def execute(self, current_prompt: str, project_name: str) -> str:
         try:
-            while True:
-                rendered_prompt = self.render(current_prompt)
-                response = self.llm.inference(rendered_prompt, project_name)
-                valid_response = self.validate_response(response)
-                if valid_response:
-                    return valid_response
-                else:
-                    print("Invalid response from the model, trying again...")
+            rendered_prompt = self.render(current_prompt)
+            return retry_controller.run("internal_monologue", project_name, rendered_prompt,
+                                        lambda attempt_prompt: self.llm.inference(attempt_prompt, project_name),
+                                        self.validate_response)
         except Exception as e:
             print(f"Error executing InternalMonologue: {e}")
             return ""
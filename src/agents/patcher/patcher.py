@@ -1,17 +1,20 @@
-import os
-import time
-from jinja2 import Environment, BaseLoader
-from typing import List, Dict, Union
+from typing import List, Dict, Tuple, Union
 from src.config import Config
-from src.llm import LLM
+from src.llm.clients import agent_llm
+from src.llm.stream import stream_files
+from src.code_parser import CodeParseError, FilesStreamParser, parse_files
 from src.state import AgentState
+from src.filesystem.writer import ProjectWriter, CHANGED
+from src.logger import Logger
+from src.retry import retry_controller
+from src.prompts import render_prompt
 
 class Patcher:
     def __init__(self, base_model: str):
-        self.project_dir = Config().get_projects_dir()
-        self.llm = LLM(model_id=base_model)
-        self.env = Environment(loader=BaseLoader())
-        self.prompt_template = self.env.from_string(open("src/agents/patcher/prompt.jinja2").read().strip())
+        self.config = Config()
+        self.project_dir = self.config.get_projects_dir()
+        self.logger = Logger()
+        self.llm = agent_llm(base_model, "patcher")
 
     def render(
         self,
@@ -21,7 +24,8 @@ class Patcher:
         error: str,
         system_os: str
     ) -> str:
-        return self.prompt_template.render(
+        return render_prompt(
+            "patcher",
             conversation=conversation,
             code_markdown=code_markdown,
             commands=commands,
@@ -31,58 +35,52 @@ class Patcher:
 
     def validate_response(self, response: str) -> Union[List[Dict[str, str]], bool]:
         try:
-            response = response.strip()
-            if "~~~" in response:
-                response = response.split("~~~", 1)[1].rsplit("~~~", 1)[0].strip()
-                result = []
-                current_file = None
-                current_code = []
-
-                for line in response.split("\n"):
-                    if line.startswith("File: "):
-                        if current_file and current_code:
-                            result.append({"file": current_file, "code": "\n".join(current_code)})
-                        current_file = line.split("`")[1].strip()
-                        current_code = []
-                    elif not line.startswith("```"):
-                        current_code.append(line)
-
-                if current_file and current_code:
-                    result.append({"file": current_file, "code": "\n".join(current_code)})
-                return result
-            else:
-                return False
-        except Exception as e:
-            print(f"Error validating response: {e}")
+            return parse_files(response)
+        except CodeParseError as e:
+            self.logger.error(f"Error validating response: {e}")
             return False
 
     def save_code_to_project(self, response: List[Dict[str, str]], project_name: str) -> str:
-        project_name = project_name.lower().replace(" ", "-")
-        file_path_dir = f"{self.project_dir}/{project_name}"
+        file_path_dir = f"{self.project_dir}/{project_name.lower().replace(' ', '-')}"
 
-        for file in response:
-            file_path = f"{file_path_dir}/{file['file']}"
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, "w") as f:
-                f.write(file["code"])
+        agent_state = AgentState()
+        with agent_state.state_batch(project_name, pace_ms=self.config.code_writing_pace_ms) as batch, \
+                ProjectWriter(file_path_dir, project_name) as writer:
+            for file in response:
+                if writer.write(file["file"], file["code"]) in CHANGED:
+                    batch.append(self.code_writing_state(agent_state, file))
 
         return file_path_dir
 
+    def stream_code_to_project(self, prompt: str, project_name: str) -> Tuple[str, Union[List[Dict[str, str]], bool]]:
+        file_path_dir = f"{self.project_dir}/{project_name.lower().replace(' ', '-')}"
+
+        agent_state = AgentState()
+        with agent_state.state_batch(project_name, pace_ms=self.config.code_writing_pace_ms) as batch, \
+                ProjectWriter(file_path_dir, project_name) as writer:
+            def save_file(file: dict):
+                if writer.write(file["file"], file["code"]) in CHANGED:
+                    batch.append(self.code_writing_state(agent_state, file))
+
+            response, files = stream_files(self.llm, prompt, project_name, FilesStreamParser(), save_file)
+            # Only a response that parses as a whole may touch the project.
+            if not files:
+                batch.discard()
+                writer.discard()
+            return response, files or False
+
     def response_to_markdown_prompt(self, response: List[Dict[str, str]]) -> str:
         return "\n".join([f"File: `{file['file']}`:\n```\n{file['code']}\n```" for file in response])
 
-    def emulate_code_writing(self, code_set: list, project_name: str) -> None:
-        for file_data in code_set:
-            filename = file_data["file"]
-            code = file_data["code"]
+    def code_writing_state(self, agent_state: AgentState, file_data: dict) -> dict:
+        filename = file_data["file"]
 
-            new_state = AgentState().new_state()
-            new_state["internal_monologue"] = "Writing code..."
-            new_state["terminal_session"]["title"] = f"Editing {filename}"
-            new_state["terminal_session"]["command"] = f"vim {filename}"
-            new_state["terminal_session"]["output"] = code
-            AgentState().add_to_current_state(project_name, new_state)
-            time.sleep(1)
+        new_state = agent_state.new_state()
+        new_state["internal_monologue"] = "Writing code..."
+        new_state["terminal_session"]["title"] = f"Editing {filename}"
+        new_state["terminal_session"]["command"] = f"vim {filename}"
+        new_state["terminal_session"]["output"] = file_data["code"]
+        return new_state
 
     def execute(
         self,
@@ -94,15 +92,5 @@ class Patcher:
         project_name: str
     ) -> Union[List[Dict[str, str]], bool]:
         prompt = self.render(conversation, code_markdown, commands, error, system_os)
-        response = self.llm.inference(prompt, project_name)
-        
-        valid_response = self.validate_response(response)
-        
-        while not valid_response:
-            print("Invalid response from the model, trying again...")
-            response = self.llm.inference(prompt, project_name)
-            valid_response = self.validate_response(response)
-        
-        self.emulate_code_writing(valid_response, project_name)
-
-        return valid_response
+        return retry_controller.run("patcher", project_name, prompt,
+                                    lambda attempt_prompt: self.stream_code_to_project(attempt_prompt, project_name))
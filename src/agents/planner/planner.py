@@ -1,15 +1,12 @@
-import os
-from jinja2 import Environment, FileSystemLoader
-from src.llm import LLM
+from src.llm.clients import agent_llm
+from src.prompts import render_prompt
 
 class Planner:
-    def __init__(self, base_model: str, template_path: str):
-        self.llm = LLM(model_id=base_model)
-        self.env = Environment(loader=FileSystemLoader(os.path.dirname(template_path)))
-        self.template = self.env.get_template(os.path.basename(template_path))
+    def __init__(self, base_model: str):
+        self.llm = agent_llm(base_model, "planner")
 
     def render(self, prompt: str) -> str:
-        return self.template.render(prompt=prompt)
+        return render_prompt("planner", prompt=prompt)
 
     def validate_response(self, response: str) -> bool:
         # Placeholder validation logic
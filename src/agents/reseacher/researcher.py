@@ -1,25 +1,18 @@
 import json
-from jinja2 import Environment, BaseLoader
 from typing import List, Union
 
-from src.llm import LLM
-from src.browser.search import BingSearch
+from src.llm.clients import agent_llm
+from src.retry import retry_controller
+from src.prompts import render_prompt
 
-# Load the Jinja2 template from file
-with open("src/agents/researcher/prompt.jinja2", "r") as prompt_file:
-    PROMPT = prompt_file.read().strip()
-
-//if the BT us traversed in order, the order in which the node will be visited is 
 class Researcher:
     def __init__(self, base_model: str):
-        self.bing_search = BingSearch()
-        self.llm = LLM(model_id=base_model)
+        self.llm = agent_llm(base_model, "researcher")
 
     def render(self, step_by_step_plan: str, contextual_keywords: str) -> str:
         """Render the template with the given step-by-step plan and contextual keywords."""
-        env = Environment(loader=BaseLoader())
-        template = env.from_string(PROMPT)
-        return template.render(
+        return render_prompt(
+            "researcher",
             step_by_step_plan=step_by_step_plan,
             contextual_keywords=contextual_keywords
         )
@@ -47,13 +40,7 @@ class Researcher:
         """Execute the research task with the given plan, keywords, and project name."""
         contextual_keywords_str = ", ".join(map(str.capitalize, contextual_keywords))
         prompt = self.render(step_by_step_plan, contextual_keywords_str)
-        
-        response = self.llm.inference(prompt, project_name)
-        
-        valid_response = self.validate_response(response)
-
-        if not valid_response:
-            print("Invalid response from the model, trying again...")
-            return self.execute(step_by_step_plan, contextual_keywords, project_name)
 
-        return valid_response
+        return retry_controller.run("researcher", project_name, prompt,
+                                    lambda attempt_prompt: self.llm.inference(attempt_prompt, project_name),
+                                    self.validate_response)
@@ -0,0 +1,109 @@
+import threading
+from collections import OrderedDict
+from typing import List, Tuple
+
+import numpy as np
+
+from src.logger import Logger
+
+KEYPHRASE_NGRAM_RANGE = (1, 1)
+STOP_WORDS = "english"
+TOP_N = 5
+DIVERSITY = 0.7
+MAX_CACHED_EMBEDDINGS = 50000
+
+
+class EmbeddingService:
+    """One KeyBERT model per process, shared by every agent.
+
+    `extract_keywords_many` embeds all sentences in one forward pass and reuses cached
+    embeddings of candidate phrases (an LRU keyed by text), so only phrases never seen
+    before go through the model.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance._setup()
+                cls._instance = instance
+        return cls._instance
+
+    def _setup(self):
+        self.logger = Logger()
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "forward_passes": 0}
+
+    @property
+    def model(self):
+        with self._model_lock:
+            if self._model is None:
+                from keybert import KeyBERT
+                self._model = KeyBERT()
+                self.logger.info("KeyBERT model loaded.")
+        return self._model
+
+    def load(self):
+        return self.model
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embeddings for `texts`, computing only the ones missing from the LRU in one batch."""
+        found = {}
+        with self._cache_lock:
+            for text in texts:
+                vector = self._cache.get(text)
+                if vector is not None:
+                    self._cache.move_to_end(text)
+                    found[text] = vector
+            missing = list(dict.fromkeys(text for text in texts if text not in found))
+            self.stats["hits"] += len(texts) - len(missing)
+            self.stats["misses"] += len(missing)
+
+        if missing:
+            vectors = self.model.model.embed(missing)
+            with self._cache_lock:
+                self.stats["forward_passes"] += 1
+                for text, vector in zip(missing, vectors):
+                    found[text] = vector
+                    self._cache[text] = vector
+                    self._cache.move_to_end(text)
+                while len(self._cache) > MAX_CACHED_EMBEDDINGS:
+                    self._cache.popitem(last=False)
+
+        return np.stack([found[text] for text in texts])
+
+    def extract_keywords_many(self, sentences: List[str], top_n: int = TOP_N) -> List[List[Tuple[str, float]]]:
+        if not sentences:
+            return []
+        from sklearn.feature_extraction.text import CountVectorizer
+
+        vectorizer = CountVectorizer(ngram_range=KEYPHRASE_NGRAM_RANGE, stop_words=STOP_WORDS)
+        try:
+            candidates = list(vectorizer.fit(sentences).get_feature_names_out())
+        except ValueError:
+            # Nothing but stop words.
+            return [[] for _ in sentences]
+
+        keywords = self.model.extract_keywords(
+            sentences,
+            vectorizer=vectorizer,
+            top_n=top_n,
+            use_mmr=True,
+            diversity=DIVERSITY,
+            doc_embeddings=self.embed(sentences),
+            word_embeddings=self.embed(candidates)
+        )
+        # KeyBERT returns a flat list for a single document.
+        return [keywords] if len(sentences) == 1 else keywords
+
+    def extract_keywords(self, sentence: str, top_n: int = TOP_N) -> List[Tuple[str, float]]:
+        return self.extract_keywords_many([sentence], top_n)[0]
+
+
+def get_embedding_service() -> EmbeddingService:
+    return EmbeddingService()
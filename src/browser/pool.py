@@ -0,0 +1,177 @@
+import asyncio
+import atexit
+import base64
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from playwright.async_api import async_playwright
+
+from src.config import Config
+from src.logger import Logger
+from src.state import AgentState
+
+
+class PooledPage:
+    def __init__(self, context, page):
+        self.context = context
+        self.page = page
+        self.uses = 0
+        self.last_used = time.monotonic()
+
+    def is_healthy(self) -> bool:
+        return not self.page.is_closed()
+
+    async def go_to(self, url: str):
+        await self.page.goto(url, timeout=20000)
+
+    async def screenshot(self, project_name: str):
+        page_url = self.page.url
+        path_to_save = os.path.join(Config().get_screenshots_dir(), f"{os.urandom(20).hex()}.png")
+
+        await self.page.emulate_media(media="screen")
+        screenshot = await self.page.screenshot(path=path_to_save, full_page=True)
+        screenshot_bytes = base64.b64encode(screenshot).decode()
+
+        agent_state = AgentState()
+        new_state = agent_state.new_state()
+        new_state["internal_monologue"] = "Browsing the web right now..."
+        new_state["browser_session"]["url"] = page_url
+        new_state["browser_session"]["screenshot"] = path_to_save
+        agent_state.add_to_current_state(project_name, new_state)
+
+        return path_to_save, screenshot_bytes
+
+    async def extract_text(self) -> str:
+        return await self.page.evaluate("() => document.body.innerText")
+
+    async def close(self):
+        try:
+            await self.context.close()
+        except Exception:
+            pass
+
+
+class BrowserPool:
+    """One long-lived Chromium process lending out pages, each in its own context.
+
+    Pages are recycled after `max_uses` checkouts or when they sit idle longer than
+    `idle_timeout` seconds; unhealthy pages and a disconnected browser are replaced on
+    the next checkout. All methods must run on the same event loop. `start` reaps idle
+    pages on that loop every `reap_interval` seconds, between checkouts too, and closes
+    the browser at interpreter exit.
+    """
+
+    def __init__(self, max_pages: int = 4, max_uses: int = 20, idle_timeout: float = 300,
+                 reap_interval: float = 60):
+        self.max_pages = max_pages
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.logger = Logger()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reaper = None
+
+        self._playwright = None
+        self._browser = None
+        self._idle: List[PooledPage] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._launch_lock: Optional[asyncio.Lock] = None
+
+    async def _ensure_browser(self):
+        if self._launch_lock is None:
+            self._launch_lock = asyncio.Lock()
+            self._slots = asyncio.Semaphore(self.max_pages)
+
+        async with self._launch_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return
+            if self._browser is not None:
+                self.logger.warning("Browser disconnected, relaunching...")
+                self._idle.clear()
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=True)
+
+    async def _reap_idle(self):
+        now = time.monotonic()
+        # Take stale pages out before awaiting, so a concurrent checkout never gets one.
+        stale = [pooled for pooled in self._idle
+                 if not pooled.is_healthy() or now - pooled.last_used >= self.idle_timeout]
+        self._idle = [pooled for pooled in self._idle if pooled not in stale]
+        for pooled in stale:
+            await pooled.close()
+
+    async def _reap_forever(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self._reap_idle()
+            except Exception as e:
+                self.logger.warning(f"Reaping idle browser pages failed: {str(e)}")
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Run the idle reaper on `loop` and close the pool there at interpreter exit."""
+        self._loop = loop
+        self._reaper = asyncio.run_coroutine_threadsafe(self._reap_forever(), loop)
+        atexit.register(self.shutdown)
+
+    def shutdown(self, timeout: float = 10):
+        """Close the pool from outside its loop, as `start` arranges at exit."""
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.close(), self._loop).result(timeout)
+        except Exception as e:
+            self.logger.warning(f"Closing the browser pool failed: {str(e)}")
+
+    async def acquire(self) -> PooledPage:
+        await self._ensure_browser()
+        await self._slots.acquire()
+        try:
+            await self._reap_idle()
+            if self._idle:
+                return self._idle.pop()
+            context = await self._browser.new_context()
+            return PooledPage(context, await context.new_page())
+        except Exception:
+            self._slots.release()
+            raise
+
+    async def release(self, pooled: PooledPage):
+        pooled.uses += 1
+        pooled.last_used = time.monotonic()
+        if (pooled.uses >= self.max_uses or not pooled.is_healthy()
+                or self._browser is None or not self._browser.is_connected()):
+            await pooled.close()
+        else:
+            self._idle.append(pooled)
+        self._slots.release()
+
+    @asynccontextmanager
+    async def page(self):
+        pooled = await self.acquire()
+        try:
+            yield pooled
+        except Exception:
+            # A page that failed mid-navigation is not worth reusing.
+            pooled.uses = self.max_uses
+            raise
+        finally:
+            await self.release(pooled)
+
+    async def close(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for pooled in self._idle:
+            await pooled.close()
+        self._idle = []
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
@@ -0,0 +1,409 @@
+import json
+import re
+from typing import Dict, List, Optional
+
+# Responses carry files either as ``File: `path` `` headers with fenced code, or as a JSON
+# array of {"file", "code"} objects, in both cases after a ``~~~`` marker. The one-shot
+# parsers walk the text once with `find`/`startswith` at offsets and slice every code body
+# exactly once; the stream parsers hand out each file as soon as it is complete.
+
+_JSON_STRUCTURE = re.compile(r'["{}\[\]]')
+_JSON_STRING_END = re.compile(r'["\\]')
+_json_decoder = json.JSONDecoder()
+
+
+class CodeParseError(ValueError):
+    def __init__(self, message: str, offset: int, text: Optional[str] = None, byte_offset: Optional[int] = None):
+        # `offset` counts characters; `byte_offset` is its UTF-8 position, computed from the
+        # full text when given, otherwise passed in by stream parsers that keep a running count.
+        self.offset = offset
+        self.byte_offset = _utf8_len(text[:offset]) if text is not None else byte_offset
+        if self.byte_offset is not None:
+            super().__init__(f"{message} (at byte {self.byte_offset})")
+        else:
+            super().__init__(f"{message} (at offset {offset})")
+
+
+def _utf8_len(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+def _is_file_object(item) -> bool:
+    return isinstance(item, dict) and isinstance(item.get("file"), str) and isinstance(item.get("code"), str)
+
+
+def _file_record(file: str, code: str, done: List[Dict[str, str]]):
+    code = code.rstrip()
+    if file and code:
+        done.append({"file": file, "code": code})
+
+
+def _header_path(line: str) -> Optional[str]:
+    parts = line.split("`", 2)
+    if len(parts) < 3 or not parts[1].strip():
+        return None
+    return parts[1].strip()
+
+
+def _body_start(text: str) -> int:
+    """Offset of the line after the first ``~~~`` marker, or -1."""
+    marker = text.find("~~~")
+    if marker == -1:
+        return -1
+    line_end = text.find("\n", marker)
+    return len(text) if line_end == -1 else line_end + 1
+
+
+def _parse_file_blocks_at(text: str, pos: int) -> List[Dict[str, str]]:
+    files = []
+    end = len(text)
+    file = None
+    code_start = -1
+    in_fence = False
+    fence_offset = 0
+
+    while pos < end:
+        line_end = text.find("\n", pos)
+        if line_end == -1:
+            line_end = end
+
+        if in_fence:
+            if text.startswith("```", pos):
+                _file_record(file, text[code_start:pos], files)
+                in_fence = False
+                file = None
+        elif text.startswith("~~~", pos):
+            break
+        elif text.startswith("File:", pos):
+            if file is not None and code_start != -1:
+                _file_record(file, text[code_start:pos], files)
+            file = _header_path(text[pos:line_end])
+            if file is None:
+                raise CodeParseError("File header without a `quoted` path", pos, text)
+            code_start = -1
+        elif text.startswith("```", pos):
+            if file is None:
+                raise CodeParseError("Code block without a File header", pos, text)
+            in_fence = True
+            fence_offset = pos
+            code_start = line_end + 1
+        elif file is not None and code_start == -1:
+            # Unfenced code directly under a File header.
+            code_start = pos
+
+        pos = line_end + 1
+
+    if in_fence:
+        raise CodeParseError("Unterminated code block", fence_offset, text)
+    if file is not None and code_start != -1:
+        _file_record(file, text[code_start:min(pos, end)], files)
+    return files
+
+
+def _parse_json_files_at(text: str, pos: int) -> List[Dict[str, str]]:
+    try:
+        data, array_end = _json_decoder.raw_decode(text, pos)
+    except json.JSONDecodeError as e:
+        raise CodeParseError(f"Invalid JSON: {e.msg}", e.pos, text)
+
+    if not isinstance(data, list):
+        raise CodeParseError("Expected a JSON array of files", pos, text)
+    for item in data:
+        if not _is_file_object(item):
+            raise CodeParseError("Object without string file and code values", pos, text)
+    return data
+
+
+def _skip_whitespace(text: str, pos: int) -> int:
+    end = len(text)
+    while pos < end and text[pos].isspace():
+        pos += 1
+    return pos
+
+
+def parse_file_blocks(response: str) -> List[Dict[str, str]]:
+    pos = _body_start(response)
+    if pos == -1:
+        raise CodeParseError("No ~~~ delimited block in response", len(response), response)
+    return _parse_file_blocks_at(response, pos)
+
+
+def parse_json_files(response: str) -> List[Dict[str, str]]:
+    pos = _body_start(response)
+    if pos == -1:
+        raise CodeParseError("No ~~~ delimited block in response", len(response), response)
+    return _parse_json_files_at(response, _skip_whitespace(response, pos))
+
+
+def parse_files(response: str) -> List[Dict[str, str]]:
+    """Parse either response format, picking JSON when the block opens with ``[``."""
+    pos = _body_start(response)
+    if pos == -1:
+        raise CodeParseError("No ~~~ delimited block in response", len(response), response)
+    first = _skip_whitespace(response, pos)
+    if response.startswith("[", first):
+        return _parse_json_files_at(response, first)
+    return _parse_file_blocks_at(response, pos)
+
+
+class FileBlockStreamParser:
+    """Incremental parser for the ``File: `path` `` plus fenced code format.
+
+    Text is fed in arbitrary chunks; `feed` returns each file as soon as its closing fence
+    has been seen. Structural errors raise `CodeParseError` right away. Only the new chunk
+    is searched for newlines and an unfinished line is kept as a list of pieces, so a
+    single very long line still costs linear time.
+    """
+
+    def __init__(self):
+        self._partial = []
+        self._offset = 0
+        self._byte_offset = 0
+        self._started = False
+        self._finished = False
+        self._file = None
+        self._code = []
+        self._in_fence = False
+        self._fence_offset = 0
+        self._fence_byte_offset = 0
+
+    def _emit(self, done: List[Dict[str, str]]):
+        if self._file is not None:
+            _file_record(self._file, "\n".join(self._code), done)
+        self._file = None
+        self._code = []
+
+    def _process_line(self, line: str, done: List[Dict[str, str]]):
+        offset = self._offset
+        if self._finished:
+            return
+        if not self._started:
+            self._started = "~~~" in line
+            return
+
+        if self._in_fence:
+            if line.startswith("```"):
+                self._in_fence = False
+                self._emit(done)
+            else:
+                self._code.append(line)
+        elif line.startswith("~~~"):
+            self._emit(done)
+            self._finished = True
+        elif line.startswith("File:"):
+            self._emit(done)
+            self._file = _header_path(line)
+            if self._file is None:
+                raise CodeParseError("File header without a `quoted` path", offset, byte_offset=self._byte_offset)
+        elif line.startswith("```"):
+            if self._file is None:
+                raise CodeParseError("Code block without a File header", offset, byte_offset=self._byte_offset)
+            self._in_fence = True
+            self._fence_offset = offset
+            self._fence_byte_offset = self._byte_offset
+            self._code = []
+        elif self._file is not None:
+            self._code.append(line)
+
+    def _take_line(self, tail: str) -> str:
+        if not self._partial:
+            return tail
+        self._partial.append(tail)
+        line = "".join(self._partial)
+        self._partial = []
+        return line
+
+    def feed(self, chunk: str) -> List[Dict[str, str]]:
+        done = []
+        start = 0
+        newline = chunk.find("\n")
+        while newline != -1:
+            line = self._take_line(chunk[start:newline])
+            self._process_line(line, done)
+            self._offset += len(line) + 1
+            self._byte_offset += _utf8_len(line) + 1
+            start = newline + 1
+            newline = chunk.find("\n", start)
+        if start < len(chunk):
+            self._partial.append(chunk[start:])
+        return done
+
+    def close(self) -> List[Dict[str, str]]:
+        done = []
+        if self._partial:
+            line = self._take_line("")
+            self._process_line(line, done)
+            self._offset += len(line)
+            self._byte_offset += _utf8_len(line)
+        if not self._started:
+            raise CodeParseError("No ~~~ delimited block in response", self._offset, byte_offset=self._byte_offset)
+        if self._in_fence:
+            raise CodeParseError("Unterminated code block", self._fence_offset, byte_offset=self._fence_byte_offset)
+        if not self._finished:
+            self._emit(done)
+        return done
+
+
+class JsonFilesStreamParser:
+    """Incremental parser for a ``~~~``-delimited JSON array of {"file", "code"} objects.
+
+    Each chunk is scanned once, string bodies are skipped with a regex search, and the
+    pieces of the object being received are joined only when it closes.
+    """
+
+    def __init__(self):
+        self._preamble = ""
+        self._offset = 0
+        self._byte_offset = 0
+        self._started = False
+        self._array_open = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._pieces = []
+        self._object_offset = 0
+        self._object_byte_offset = 0
+
+    def _object(self) -> Dict[str, str]:
+        text = "".join(self._pieces)
+        self._pieces = []
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise CodeParseError(f"Invalid JSON object: {e.msg}", self._object_offset + e.pos,
+                                 byte_offset=self._object_byte_offset + _utf8_len(text[:e.pos]))
+        if not _is_file_object(item):
+            raise CodeParseError("Object without string file and code values", self._object_offset,
+                                 byte_offset=self._object_byte_offset)
+        return item
+
+    def _scan(self, chunk: str, done: List[Dict[str, str]]):
+        pos = 0
+        end = len(chunk)
+        object_from = 0
+        # Bytes before `counted_to` in this chunk, advanced only where an offset is needed.
+        counted_to = 0
+        counted_bytes = self._byte_offset
+
+        while pos < end and not self._finished:
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                    pos += 1
+                    continue
+                match = _JSON_STRING_END.search(chunk, pos)
+                if match is None:
+                    pos = end
+                elif match.group() == "\\":
+                    self._escaped = True
+                    pos = match.end()
+                else:
+                    self._in_string = False
+                    pos = match.end()
+            elif self._depth:
+                match = _JSON_STRUCTURE.search(chunk, pos)
+                if match is None:
+                    pos = end
+                    continue
+                char = match.group()
+                pos = match.end()
+                if char == '"':
+                    self._in_string = True
+                elif char in "{[":
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if not self._depth:
+                        self._pieces.append(chunk[object_from:pos])
+                        done.append(self._object())
+            else:
+                char = chunk[pos]
+                if char.isspace() or (char == "," and self._array_open):
+                    pass
+                elif char == "[" and not self._array_open:
+                    self._array_open = True
+                elif char == "]" and self._array_open:
+                    self._finished = True
+                elif char == "{" and self._array_open:
+                    self._depth = 1
+                    object_from = pos
+                    counted_bytes += _utf8_len(chunk[counted_to:pos])
+                    counted_to = pos
+                    self._object_offset = self._offset + pos
+                    self._object_byte_offset = counted_bytes
+                else:
+                    raise CodeParseError(f"Unexpected {char!r} in file list", self._offset + pos,
+                                         byte_offset=counted_bytes + _utf8_len(chunk[counted_to:pos]))
+                pos += 1
+
+        if self._depth:
+            self._pieces.append(chunk[object_from:])
+        self._offset += end
+        self._byte_offset = counted_bytes + _utf8_len(chunk[counted_to:])
+
+    def feed(self, chunk: str) -> List[Dict[str, str]]:
+        done = []
+        if not self._started:
+            self._preamble += chunk
+            body = _body_start(self._preamble)
+            if body == -1 or (body == len(self._preamble) and not self._preamble.endswith("\n")):
+                return done
+            self._started = True
+            self._offset = body
+            self._byte_offset = _utf8_len(self._preamble[:body])
+            chunk = self._preamble[body:]
+            self._preamble = ""
+
+        self._scan(chunk, done)
+        return done
+
+    def close(self) -> List[Dict[str, str]]:
+        if not self._started and _body_start(self._preamble) != -1:
+            # The marker line did not end with a newline, so nothing follows it.
+            self._started = True
+        if not self._started or not self._array_open:
+            raise CodeParseError("No ~~~ delimited JSON array in response", self._offset,
+                                 byte_offset=self._byte_offset)
+        if not self._finished:
+            raise CodeParseError("Unterminated JSON array", self._offset, byte_offset=self._byte_offset)
+        return []
+
+
+class FilesStreamParser:
+    """Streams either format, choosing JSON when the block opens with ``[``."""
+
+    def __init__(self):
+        self._buffer = ""
+        self._parser = None
+
+    def _detect(self, final: bool = False):
+        body = _body_start(self._buffer)
+        if body == -1:
+            return
+        first = _skip_whitespace(self._buffer, body)
+        if first == len(self._buffer) and not final:
+            return
+        if self._buffer.startswith("[", first):
+            self._parser = JsonFilesStreamParser()
+        else:
+            self._parser = FileBlockStreamParser()
+
+    def feed(self, chunk: str) -> List[Dict[str, str]]:
+        if self._parser is not None:
+            return self._parser.feed(chunk)
+        self._buffer += chunk
+        self._detect()
+        if self._parser is None:
+            return []
+        buffered, self._buffer = self._buffer, ""
+        return self._parser.feed(buffered)
+
+    def close(self) -> List[Dict[str, str]]:
+        if self._parser is None:
+            self._detect(final=True)
+            if self._parser is None:
+                self._parser = FileBlockStreamParser()
+            buffered, self._buffer = self._buffer, ""
+            return self._parser.feed(buffered) + self._parser.close()
+        return self._parser.close()
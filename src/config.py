@@ -52,6 +52,22 @@ class Config:
     def bing_api_key(self, key):
         self._set_value("API_KEYS.BING", key)
 
+    @property
+    def llm_cache_mode(self):
+        return self._get_value("LLM_CACHE.MODE", "off")
+
+    @property
+    def llm_cache_agents(self):
+        return self._get_value("LLM_CACHE.AGENTS", [])
+
+    @property
+    def code_writing_pace_ms(self):
+        return self._get_value("UI.CODE_WRITING_PACE_MS")
+
+    @property
+    def agent_workers(self):
+        return self._get_value("AGENT.WORKERS", 4)
+
     # Implement other properties similarly
     # ...
 
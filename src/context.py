@@ -0,0 +1,178 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from src.logger import Logger
+from src.filesystem.snapshot import ProjectSnapshotIndex
+from src.project import ProjectManager, format_message
+
+# Total prompt tokens each agent may spend on project code plus conversation history.
+CONTEXT_BUDGETS = {
+    "action": 4000,
+    "answer": 8000,
+    "runner": 8000,
+    "feature": 12000,
+    "patcher": 12000,
+    "reporter": 12000,
+}
+DEFAULT_BUDGET = 8000
+# At most this share of a budget goes to conversation history; code gets the rest.
+CONVERSATION_SHARE = 0.3
+# The newest messages are kept first, whatever their relevance, as far as the share allows.
+KEEP_RECENT_MESSAGES = 2
+# Only this many of the latest messages are read from history as candidates.
+HISTORY_WINDOW = 200
+# Token counts and term sets are cached for this many messages.
+MESSAGE_CACHE_SIZE = 10000
+
+_WORD = re.compile(r"[a-zA-Z_][a-zA-Z0-9_]{2,}")
+
+
+def _terms(text: str) -> set:
+    return {word.lower() for word in _WORD.findall(text)}
+
+
+class ContextBuilder:
+    """Fits project files and conversation history into a per-agent token budget.
+
+    Candidates are ranked by how many terms they share with the current prompt and packed
+    greedily until the budget is spent. Files come from the project snapshot index; token
+    counts and term sets are cached by content hash, so only changed files are re-tokenized.
+    Messages are stored once and never edited, so theirs are cached by message id.
+    """
+
+    def __init__(self, tokenizer, budgets: Dict[str, int] = None):
+        self.tokenizer = tokenizer
+        self.budgets = dict(CONTEXT_BUDGETS, **(budgets or {}))
+        self.snapshot_index = ProjectSnapshotIndex()
+        self.logger = Logger()
+
+        self._lock = threading.Lock()
+        self._files = {}
+        self._messages = OrderedDict()
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer.encode(text))
+
+    def _file_entry(self, project_name: str, snapshot_entry: dict) -> dict:
+        key = (project_name, snapshot_entry["path"])
+        with self._lock:
+            entry = self._files.get(key)
+        if entry is None or entry["sha256"] != snapshot_entry["sha256"]:
+            markdown = snapshot_entry["markdown"]
+            entry = {
+                "path": snapshot_entry["path"],
+                "sha256": snapshot_entry["sha256"],
+                "markdown": markdown,
+                "tokens": self.count_tokens(markdown),
+                "terms": _terms(markdown),
+                "path_terms": _terms(snapshot_entry["path"]),
+            }
+            with self._lock:
+                self._files[key] = entry
+        return dict(entry, mtime_ns=snapshot_entry["mtime_ns"])
+
+    def _message_entry(self, message: dict) -> dict:
+        key = message.get("id")
+        with self._lock:
+            entry = self._messages.get(key) if key is not None else None
+            if entry is not None:
+                self._messages.move_to_end(key)
+        if entry is None:
+            text = format_message(message)
+            entry = {"text": text, "tokens": self.count_tokens(text), "terms": _terms(text)}
+            if key is not None:
+                with self._lock:
+                    self._messages[key] = entry
+                    if len(self._messages) > MESSAGE_CACHE_SIZE:
+                        self._messages.popitem(last=False)
+        return entry
+
+    def recent_messages(self, project_name: str) -> List[dict]:
+        """The latest messages of `project_name` to choose a conversation from."""
+        return ProjectManager().tail(project_name, HISTORY_WINDOW)
+
+    def _truncate(self, text: str, budget: int) -> str:
+        return self.tokenizer.decode(self.tokenizer.encode(text)[:budget])
+
+    def _project_files(self, project_name: str) -> List[dict]:
+        return [self._file_entry(project_name, entry) for entry in self.snapshot_index.get_entries(project_name)]
+
+    def budget_for(self, agent: str) -> int:
+        return self.budgets.get(agent, DEFAULT_BUDGET)
+
+    def select_messages(self, messages: List[dict], prompt_terms: set, budget: int) -> Tuple[List[str], int]:
+        """Pick formatted messages, oldest first, whose tokens add up to at most `budget`.
+
+        The newest message is cut to the budget rather than dropped when it does not fit on its own.
+        """
+        if not messages or budget <= 0:
+            return [], 0
+
+        entries = [self._message_entry(message) for message in messages]
+        selected = {}
+        used = 0
+        recent_from = max(0, len(entries) - KEEP_RECENT_MESSAGES)
+        for index in range(len(entries) - 1, recent_from - 1, -1):
+            if used + entries[index]["tokens"] <= budget:
+                selected[index] = entries[index]["text"]
+                used += entries[index]["tokens"]
+            elif not selected:
+                selected[index] = self._truncate(entries[index]["text"], budget)
+                used = budget
+            else:
+                break
+
+        # Older messages: most relevant first, newer first among equals.
+        ranked = sorted(
+            range(recent_from),
+            key=lambda index: (len(prompt_terms & entries[index]["terms"]), index),
+            reverse=True
+        )
+        for index in ranked:
+            if used + entries[index]["tokens"] <= budget:
+                selected[index] = entries[index]["text"]
+                used += entries[index]["tokens"]
+
+        return [selected[index] for index in sorted(selected)], used
+
+    def select_code(self, project_name: str, prompt_terms: set, budget: int) -> Tuple[str, int]:
+        entries = self._project_files(project_name)
+        ranked = sorted(
+            entries,
+            key=lambda entry: (
+                3 * len(prompt_terms & entry["path_terms"]) + len(prompt_terms & entry["terms"]),
+                entry["mtime_ns"]
+            ),
+            reverse=True
+        )
+
+        chosen = []
+        used = 0
+        for entry in ranked:
+            if used + entry["tokens"] <= budget:
+                chosen.append(entry)
+                used += entry["tokens"]
+
+        if len(chosen) < len(entries):
+            self.logger.info(f"Context for {project_name}: {len(chosen)}/{len(entries)} files "
+                             f"fit in {budget} tokens")
+        chosen.sort(key=lambda entry: entry["path"])
+        return "".join(entry["markdown"] for entry in chosen), used
+
+    def build_conversation(self, agent: str, prompt: str, messages: List[dict]) -> List[str]:
+        conversation, _ = self.select_messages(messages, _terms(prompt), self.budget_for(agent))
+        return conversation
+
+    def build(self, agent: str, project_name: str, prompt: str, messages: List[dict]) -> Tuple[List[str], str]:
+        """Return the (conversation, code_markdown) pair to pass to `agent`.
+
+        `messages` are message dicts as returned by `ProjectManager.tail`.
+        """
+        budget = self.budget_for(agent)
+        prompt_terms = _terms(prompt)
+
+        conversation, used = self.select_messages(messages, prompt_terms, int(budget * CONVERSATION_SHARE))
+        code_markdown, _ = self.select_code(project_name, prompt_terms, budget - used)
+        return conversation, code_markdown
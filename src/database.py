@@ -0,0 +1,57 @@
+import os
+import threading
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlmodel import SQLModel, create_engine
+
+POOL_SIZE = 5
+MAX_OVERFLOW = 10
+POOL_TIMEOUT = 30
+BUSY_TIMEOUT_MS = 5000
+
+_engines = {}
+_prepared_tables = {}
+_lock = threading.Lock()
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def get_engine(sqlite_path: str) -> Engine:
+    """Return the process-wide engine for `sqlite_path`, creating missing tables on first use.
+
+    Tables of models imported after the engine was created are picked up on the next call.
+    """
+    key = os.path.abspath(sqlite_path)
+    with _lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = create_engine(
+                f"sqlite:///{key}",
+                pool_size=POOL_SIZE,
+                max_overflow=MAX_OVERFLOW,
+                pool_timeout=POOL_TIMEOUT,
+                connect_args={"check_same_thread": False},
+            )
+            event.listen(engine, "connect", _set_sqlite_pragmas)
+            _engines[key] = engine
+            _prepared_tables[key] = set()
+
+        if not _prepared_tables[key].issuperset(SQLModel.metadata.tables):
+            SQLModel.metadata.create_all(engine)
+            _prepared_tables[key] = set(SQLModel.metadata.tables)
+
+    return engine
+
+
+def dispose_engines():
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _prepared_tables.clear()
@@ -0,0 +1,242 @@
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Tuple
+
+# Formats that are already compressed; deflating them again costs CPU for no gain.
+STORED_EXTENSIONS = {
+    ".7z", ".avif", ".br", ".bz2", ".docx", ".gif", ".gz", ".jar", ".jpeg", ".jpg", ".m4a",
+    ".mov", ".mp3", ".mp4", ".ogg", ".pdf", ".png", ".pptx", ".rar", ".tgz", ".webm",
+    ".webp", ".whl", ".woff", ".woff2", ".xlsx", ".xz", ".zip", ".zst",
+}
+# Files up to this size are compressed whole in the pool; larger ones are streamed.
+PARALLEL_MAX_BYTES = 8 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+# Past these limits the archive needs Zip64, which is left to `zipfile`.
+ZIP32_MAX_BYTES = 0xFFFFFFFF - PARALLEL_MAX_BYTES
+ZIP32_MAX_ENTRIES = 0xFFFF
+
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+
+
+def _dos_datetime(mtime: float) -> Tuple[int, int]:
+    year, month, day, hour, minute, second = time.localtime(mtime)[:6]
+    year = min(max(year, 1980), 2107)
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+def _local_header(name: bytes, flags: int, method: int, dos_time: int, dos_date: int,
+                  crc: int, compressed_size: int, size: int) -> bytes:
+    return struct.pack("<IHHHHHIIIHH", 0x04034B50, 20, flags, method, dos_time, dos_date,
+                       crc, compressed_size, size, len(name), 0) + name
+
+
+class ZipExporter:
+    """Builds a project zip, compressing entries on a thread pool while it streams.
+
+    Entries are written in path order as soon as their compressed bytes are ready, with
+    at most `2 * workers` small files in flight, so memory stays bounded whatever the
+    project size. Already-compressed formats are stored instead of deflated. `export`
+    keeps the archive next to the project and reuses it while the tree's manifest hash
+    (paths, sizes and mtimes) is unchanged.
+    """
+
+    def __init__(self, compresslevel: int = 6, workers: int = None):
+        self.compresslevel = compresslevel
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self._lock = threading.Lock()
+
+    def _list_files(self, project_path: str) -> List[Tuple[str, str, os.stat_result]]:
+        # Imported here: the writer depends on src.project, which imports this module.
+        from src.filesystem.writer import STAGING_FILE
+
+        arc_root = os.path.basename(os.path.normpath(project_path))
+        files = []
+        for root, dirs, names in os.walk(project_path):
+            dirs.sort()
+            for name in sorted(names):
+                if STAGING_FILE.match(name):
+                    continue
+                path = os.path.join(root, name)
+                arcname = os.path.join(arc_root, os.path.relpath(path, project_path)).replace(os.sep, "/")
+                files.append((path, arcname, os.stat(path)))
+        return files
+
+    def content_hash(self, files: List[Tuple[str, str, os.stat_result]]) -> str:
+        digest = hashlib.sha256(f"level={self.compresslevel}\n".encode())
+        for _, arcname, stat in files:
+            digest.update(f"{arcname}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+        return digest.hexdigest()
+
+    def _method(self, arcname: str) -> int:
+        if os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS:
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+    def _compress(self, path: str, method: int) -> Tuple[bytes, int, int]:
+        with open(path, "rb") as f:
+            data = f.read()
+        crc = zlib.crc32(data)
+        if method == zipfile.ZIP_DEFLATED:
+            compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, -15)
+            return compressor.compress(data) + compressor.flush(), crc, len(data)
+        return data, crc, len(data)
+
+    def _stream_large(self, path: str, method: int, out: dict) -> Iterator[bytes]:
+        compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, -15) \
+            if method == zipfile.ZIP_DEFLATED else None
+        crc = size = compressed_size = 0
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                compressed_size += len(chunk)
+                if chunk:
+                    yield chunk
+        if compressor:
+            tail = compressor.flush()
+            compressed_size += len(tail)
+            yield tail
+        out.update(crc=crc, compressed_size=compressed_size, size=size)
+
+    def _iter_zip32(self, files: List[Tuple[str, str, os.stat_result]]) -> Iterator[bytes]:
+        central = []
+        offset = 0
+
+        def entry(arcname, stat, flags, method, crc, compressed_size, size, local_offset):
+            dos_time, dos_date = _dos_datetime(stat.st_mtime)
+            name = arcname.encode("utf-8")
+            central.append(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | 20, 20, flags, method, dos_time, dos_date,
+                crc, compressed_size, size, len(name), 0, 0, 0, 0, (stat.st_mode & 0xFFFF) << 16, local_offset
+            ) + name)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="zip-export") as pool:
+            pending = deque()
+            queue = iter(files)
+            exhausted = False
+
+            while True:
+                while not exhausted and len(pending) < 2 * self.workers:
+                    item = next(queue, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    path, arcname, stat = item
+                    method = self._method(arcname)
+                    future = pool.submit(self._compress, path, method) \
+                        if stat.st_size <= PARALLEL_MAX_BYTES else None
+                    pending.append((path, arcname, stat, method, future))
+                if not pending:
+                    break
+
+                path, arcname, stat, method, future = pending.popleft()
+                name = arcname.encode("utf-8")
+                dos_time, dos_date = _dos_datetime(stat.st_mtime)
+                local_offset = offset
+
+                if future is not None:
+                    data, crc, size = future.result()
+                    header = _local_header(name, _FLAG_UTF8, method, dos_time, dos_date, crc, len(data), size)
+                    yield header
+                    yield data
+                    offset += len(header) + len(data)
+                    entry(arcname, stat, _FLAG_UTF8, method, crc, len(data), size, local_offset)
+                else:
+                    flags = _FLAG_UTF8 | _FLAG_DATA_DESCRIPTOR
+                    header = _local_header(name, flags, method, dos_time, dos_date, 0, 0, 0)
+                    yield header
+                    offset += len(header)
+                    out = {}
+                    for chunk in self._stream_large(path, method, out):
+                        offset += len(chunk)
+                        yield chunk
+                    descriptor = struct.pack("<IIII", 0x08074B50, out["crc"], out["compressed_size"], out["size"])
+                    yield descriptor
+                    offset += len(descriptor)
+                    entry(arcname, stat, flags, method, out["crc"], out["compressed_size"],
+                          out["size"], local_offset)
+
+        directory = b"".join(central)
+        yield directory
+        yield struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, len(central), len(central), len(directory), offset, 0)
+
+    def _iter_zip64(self, files: List[Tuple[str, str, os.stat_result]]) -> Iterator[bytes]:
+        # Rare enough that the serial stdlib writer is fine; it goes through a temp file.
+        with tempfile.TemporaryFile() as temp:
+            with zipfile.ZipFile(temp, "w", zipfile.ZIP_DEFLATED, compresslevel=self.compresslevel) as zipf:
+                for path, arcname, _ in files:
+                    zipf.write(path, arcname=arcname, compress_type=self._method(arcname))
+            temp.seek(0)
+            while True:
+                chunk = temp.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    def iter_zip(self, project_path: str, files: List[Tuple[str, str, os.stat_result]] = None) -> Iterator[bytes]:
+        """Yield the archive of `project_path` chunk by chunk, without staging it on disk."""
+        if files is None:
+            files = self._list_files(project_path)
+        if len(files) > ZIP32_MAX_ENTRIES or sum(stat.st_size for _, _, stat in files) > ZIP32_MAX_BYTES:
+            return self._iter_zip64(files)
+        return self._iter_zip32(files)
+
+    def _hash_path(self, zip_path: str) -> str:
+        return f"{zip_path}.sha256"
+
+    def _cached(self, zip_path: str, content_hash: str) -> bool:
+        try:
+            with open(self._hash_path(zip_path), "r") as f:
+                return f.read().strip() == content_hash and os.path.exists(zip_path)
+        except FileNotFoundError:
+            return False
+
+    def stream(self, project_path: str, zip_path: str) -> Iterator[bytes]:
+        """Stream the archive, from the cached file when the project is unchanged.
+
+        A freshly built archive is written to a temp file while it streams and becomes the
+        cached copy once it is complete.
+        """
+        files = self._list_files(project_path)
+        content_hash = self.content_hash(files)
+
+        if self._cached(zip_path, content_hash):
+            with open(zip_path, "rb") as f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        return
+                    yield chunk
+
+        temp_path = f"{zip_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                for chunk in self.iter_zip(project_path, files):
+                    f.write(chunk)
+                    yield chunk
+            with self._lock:
+                os.replace(temp_path, zip_path)
+                with open(self._hash_path(zip_path), "w") as f:
+                    f.write(content_hash)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def export(self, project_path: str, zip_path: str) -> str:
+        for _ in self.stream(project_path, zip_path):
+            pass
+        return zip_path
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+from sqlalchemy import Index, delete
+from sqlmodel import Field, Session, SQLModel, select
+from src.config import Config
+from src.database import get_engine
+from src.logger import Logger
+from src.project import ProjectManager
+
+
+class ProjectFileEntry(SQLModel, table=True):
+    __tablename__ = "project_file_entry"
+    __table_args__ = (Index("ix_project_file_entry_project_path", "project", "path", unique=True),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    project: str
+    path: str
+    size: int
+    mtime_ns: int
+    sha256: str
+    markdown: str
+
+
+def file_markdown(relative_path: str, code: str) -> str:
+    return f"### {relative_path}:\n\n```\n{code}\n```\n\n---\n\n"
+
+
+def _entry_dict(row: ProjectFileEntry) -> dict:
+    return {"path": row.path, "size": row.size, "mtime_ns": row.mtime_ns,
+            "sha256": row.sha256, "markdown": row.markdown}
+
+
+class ProjectSnapshotIndex:
+    """Persistent per-project index of file path, size, mtime, hash and markdown fragment.
+
+    `refresh` stats every file and only reads the ones whose size or mtime changed; a
+    file whose content hash is unchanged keeps its fragment. The assembled markdown is
+    kept in memory until the next refresh finds a change.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance._setup()
+                cls._instance = instance
+        return cls._instance
+
+    def _setup(self):
+        self.config = Config()
+        self.engine = get_engine(self.config.get_sqlite_db())
+        self.project_manager = ProjectManager()
+        self.logger = Logger()
+        self._lock = threading.Lock()
+        self._projects = {}
+
+    def _load(self, project: str) -> dict:
+        snapshot = self._projects.get(project)
+        if snapshot is None:
+            with Session(self.engine) as session:
+                rows = session.exec(select(ProjectFileEntry).where(ProjectFileEntry.project == project)).all()
+            snapshot = {"entries": {row.path: _entry_dict(row) for row in rows}, "markdown": None}
+            self._projects[project] = snapshot
+        return snapshot
+
+    def _scan(self, root: str, top: str, found: Dict[str, os.stat_result]):
+        try:
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        self._scan(entry.path, top, found)
+                    elif entry.is_file():
+                        found[os.path.relpath(entry.path, top)] = entry.stat()
+        except FileNotFoundError:
+            pass
+
+    def _read_entry(self, project_path: str, path: str, stat: os.stat_result, previous: Optional[dict]) -> dict:
+        with open(os.path.join(project_path, path), "rb") as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if previous is not None and previous["sha256"] == digest:
+            markdown = previous["markdown"]
+        else:
+            markdown = file_markdown(path, content.decode("utf-8", errors="replace"))
+        return {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                "sha256": digest, "markdown": markdown}
+
+    def _persist(self, project: str, changed: List[dict], removed: List[str]):
+        paths = [entry["path"] for entry in changed] + removed
+        with Session(self.engine) as session:
+            for start in range(0, len(paths), 500):
+                session.execute(delete(ProjectFileEntry).where(
+                    ProjectFileEntry.project == project,
+                    ProjectFileEntry.path.in_(paths[start:start + 500])
+                ))
+            session.add_all(ProjectFileEntry(project=project, **entry) for entry in changed)
+            session.commit()
+
+    def refresh(self, project: str) -> dict:
+        """Bring the index of `project` up to date with the files on disk."""
+        started = time.perf_counter()
+        project_path = self.project_manager.get_project_path(project)
+        found = {}
+        self._scan(project_path, project_path, found)
+
+        with self._lock:
+            snapshot = self._load(project)
+            entries = snapshot["entries"]
+            changed = []
+            for path, stat in found.items():
+                previous = entries.get(path)
+                if previous is not None and previous["size"] == stat.st_size \
+                        and previous["mtime_ns"] == stat.st_mtime_ns:
+                    continue
+                try:
+                    changed.append(self._read_entry(project_path, path, stat, previous))
+                except OSError as e:
+                    self.logger.warning(f"Skipping {path} in snapshot of {project}: {e}")
+            removed = [path for path in entries if path not in found]
+
+            if changed or removed:
+                for entry in changed:
+                    entries[entry["path"]] = entry
+                for path in removed:
+                    del entries[path]
+                snapshot["markdown"] = None
+                self._persist(project, changed, removed)
+
+        stats = {"files": len(found), "changed": len(changed), "removed": len(removed),
+                 "seconds": time.perf_counter() - started}
+        self.logger.info(f"Snapshot of {project} refreshed :: {stats}")
+        return stats
+
+    def apply_changes(self, project: str, changes) -> None:
+        """Take files just written by a `ProjectWriter` batch without reading them back."""
+        changed = [
+            {"path": record["path"], "size": record["size"], "mtime_ns": record["mtime_ns"],
+             "sha256": record["sha256"], "markdown": file_markdown(record["path"], record["code"])}
+            for record in changes.changed_records
+        ]
+        if not changed:
+            return
+        with self._lock:
+            snapshot = self._load(project)
+            for entry in changed:
+                snapshot["entries"][entry["path"]] = entry
+            snapshot["markdown"] = None
+            self._persist(project, changed, [])
+
+    def get_entries(self, project: str) -> List[dict]:
+        self.refresh(project)
+        with self._lock:
+            entries = self._load(project)["entries"]
+            return [entries[path] for path in sorted(entries)]
+
+    def code_set_to_markdown(self, project: str) -> str:
+        self.refresh(project)
+        with self._lock:
+            snapshot = self._load(project)
+            if snapshot["markdown"] is None:
+                entries = snapshot["entries"]
+                snapshot["markdown"] = "".join(entries[path]["markdown"] for path in sorted(entries))
+            return snapshot["markdown"]
@@ -0,0 +1,227 @@
+import hashlib
+import itertools
+import os
+import re
+import threading
+from typing import List, Optional
+from src.filesystem.snapshot import ProjectSnapshotIndex
+from src.logger import Logger
+
+ADDED = "added"
+MODIFIED = "modified"
+UNCHANGED = "unchanged"
+REJECTED = "rejected"
+CHANGED = (ADDED, MODIFIED)
+
+# Files are staged as `.<name>.<pid>.<n>.tmp` next to their targets.
+STAGING_FILE = re.compile(r"^\..+\.(\d+)\.\d+\.tmp$")
+
+_temp_names = itertools.count()
+_temp_names_lock = threading.Lock()
+_swept_projects = set()
+
+
+class ChangeSet:
+    """What one write batch did to a project, one record per file passed to `write`.
+
+    Records carry the path, status, code, sha256 and the size/mtime of the file on disk,
+    which is everything the snapshot index needs to update itself without re-reading.
+    Rejected paths are recorded with their reason only.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def _paths(self, status: str) -> List[str]:
+        return [record["path"] for record in self.records if record["status"] == status]
+
+    @property
+    def added(self) -> List[str]:
+        return self._paths(ADDED)
+
+    @property
+    def modified(self) -> List[str]:
+        return self._paths(MODIFIED)
+
+    @property
+    def unchanged(self) -> List[str]:
+        return self._paths(UNCHANGED)
+
+    @property
+    def rejected(self) -> List[str]:
+        return self._paths(REJECTED)
+
+    @property
+    def changed_records(self) -> List[dict]:
+        return [record for record in self.records if record["status"] in CHANGED]
+
+    def to_dict(self) -> dict:
+        return {"added": self.added, "modified": self.modified, "unchanged": self.unchanged,
+                "rejected": self.rejected}
+
+
+class ProjectWriter:
+    """Writes a batch of files into a project directory, all or nothing.
+
+    Files whose content hash matches what is on disk are left alone. Others are written
+    to a hidden temp file next to the target as they come in, and only renamed over their
+    targets when the batch closes, so a crash or a discarded batch never leaves the
+    project half-updated. Temp files left behind by a crashed process are removed the
+    first time this process opens a writer on the project. Directories are created once per batch, and written files and
+    their directories are fsynced when the batch closes. Leaving the `with` block with an
+    exception discards the batch.
+
+        with ProjectWriter(project_path, project_name) as writer:
+            writer.write("src/app.py", code)
+        writer.changes.to_dict()
+    """
+
+    def __init__(self, project_path: str, project_name: Optional[str] = None):
+        self.project_path = os.path.abspath(project_path)
+        self.project_name = project_name
+        self.changes = ChangeSet()
+        self.logger = Logger()
+        self._created_dirs = set()
+        self._staged = {}
+        self._closed = False
+        self._remove_stale_temp_files()
+
+    def _remove_stale_temp_files(self):
+        # Only one process writes a project, so temp files of another pid are from a crash.
+        with _temp_names_lock:
+            if self.project_path in _swept_projects:
+                return
+            _swept_projects.add(self.project_path)
+        pid = str(os.getpid())
+        for root, _, names in os.walk(self.project_path):
+            for name in names:
+                match = STAGING_FILE.match(name)
+                if match and match.group(1) != pid:
+                    try:
+                        os.remove(os.path.join(root, name))
+                    except FileNotFoundError:
+                        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.discard()
+        self.close()
+
+    def _target(self, relative_path: str) -> str:
+        target = os.path.abspath(os.path.join(self.project_path, relative_path))
+        if os.path.commonpath([self.project_path, target]) != self.project_path:
+            raise ValueError(f"Refusing to write outside the project: {relative_path}")
+        return target
+
+    def _ensure_dir(self, directory: str):
+        if directory not in self._created_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._created_dirs.add(directory)
+
+    def _same_content(self, target: str, data: bytes, digest: str) -> Optional[bool]:
+        """True/False for an existing file, None when there is none."""
+        try:
+            if os.stat(target).st_size != len(data):
+                return False
+            with open(target, "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest() == digest
+        except FileNotFoundError:
+            return None
+
+    def _unstage(self, target: str):
+        temp_path, record = self._staged.pop(target)
+        self.changes.records.remove(record)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    def write(self, relative_path: str, code: str) -> str:
+        """Stage one file and return its status: "added", "modified", "unchanged" or "rejected".
+
+        A path outside the project is skipped and recorded as rejected, so one bad path in
+        a model response does not abort the rest of the batch. Writing the same path twice
+        keeps the last version.
+        """
+        if self._closed:
+            raise RuntimeError("ProjectWriter is closed")
+        try:
+            target = self._target(relative_path)
+        except ValueError as e:
+            self.logger.warning(str(e))
+            self.changes.records.append({"path": relative_path, "status": REJECTED, "reason": str(e)})
+            return REJECTED
+        if target in self._staged:
+            self._unstage(target)
+        data = code.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+
+        same = self._same_content(target, data, digest)
+        record = {
+            "path": os.path.relpath(target, self.project_path),
+            "code": code,
+            "sha256": digest,
+            "size": len(data)
+        }
+        if same:
+            stat = os.stat(target)
+            record.update(status=UNCHANGED, mtime_ns=stat.st_mtime_ns)
+            self.changes.records.append(record)
+            return UNCHANGED
+
+        status = ADDED if same is None else MODIFIED
+        directory = os.path.dirname(target)
+        self._ensure_dir(directory)
+
+        with _temp_names_lock:
+            temp_name = f".{os.path.basename(target)}.{os.getpid()}.{next(_temp_names)}.tmp"
+        temp_path = os.path.join(directory, temp_name)
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            if status == MODIFIED:
+                os.chmod(temp_path, os.stat(target).st_mode)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        record["status"] = status
+        self.changes.records.append(record)
+        self._staged[target] = (temp_path, record)
+        return status
+
+    def _fsync(self, path: str, flags: int):
+        fd = os.open(path, flags)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def discard(self):
+        """Drop everything staged so far; the project is left as it was."""
+        for target in list(self._staged):
+            self._unstage(target)
+        self.changes.records.clear()
+
+    def close(self) -> ChangeSet:
+        """Move staged files into place, fsync them and update the snapshot index."""
+        if self._closed:
+            return self.changes
+        self._closed = True
+
+        dirty_dirs = set()
+        for target, (temp_path, record) in self._staged.items():
+            self._fsync(temp_path, os.O_RDONLY)
+            os.replace(temp_path, target)
+            record["mtime_ns"] = os.stat(target).st_mtime_ns
+            dirty_dirs.add(os.path.dirname(target))
+        self._staged.clear()
+        for directory in dirty_dirs:
+            self._fsync(directory, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+
+        if self.project_name and self.changes.changed_records:
+            ProjectSnapshotIndex().apply_changes(self.project_name, self.changes)
+        return self.changes
@@ -2,7 +2,7 @@
 import os
 from src.config import Config
 from src.logger import Logger
-from src.bert.sentence import SentenceBert  # Assuming this import is required
+from src.bert.embedding_service import get_embedding_service
 
 
 def init_devika():
@@ -25,10 +25,9 @@ def init_devika():
 
         logger.info("Prerequisite directories initialized.")
 
-        # Load sentence-transformer BERT models
+        # Load the shared sentence-transformer BERT model once for the whole process
         logger.info("Loading sentence-transformer BERT models...")
-        prompt = "Light-weight keyword extraction exercise for BERT model loading.".strip()
-        SentenceBert(prompt).extract_keywords()
+        get_embedding_service().load()
         logger.info("BERT model loaded successfully.")
 
     except Exception as e:
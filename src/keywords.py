@@ -0,0 +1,81 @@
+import heapq
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+TOP_K = 10
+MAX_KEYWORDS = 500
+# Each extraction multiplies the weight of everything seen before by this factor.
+DECAY = 0.8
+# Scores are stored in forward-decay form (growing weights); rescale before they overflow.
+RESCALE_AT = 1e100
+
+
+class KeywordIndex:
+    """Keywords of one project with counts and recency-decayed scores.
+
+    Uses forward decay: the n-th extraction adds weight `(1 / DECAY) ** n` instead of
+    shrinking every existing score, so an update touches only the keywords it adds.
+    When the index outgrows `max_keywords`, it drops the lowest scores down to three
+    quarters of the cap, which keeps eviction amortized O(1) per update.
+    """
+
+    def __init__(self, max_keywords: int = MAX_KEYWORDS, decay: float = DECAY):
+        self.max_keywords = max_keywords
+        self.growth = 1 / decay
+        self.weight = 1.0
+        self.scores = {}
+        self.counts = {}
+
+    def add(self, keywords: Iterable[str]):
+        # Duplicates within one extraction count once.
+        for keyword in dict.fromkeys(keyword.strip().lower() for keyword in keywords):
+            if not keyword:
+                continue
+            self.scores[keyword] = self.scores.get(keyword, 0.0) + self.weight
+            self.counts[keyword] = self.counts.get(keyword, 0) + 1
+
+        self.weight *= self.growth
+        if self.weight > RESCALE_AT:
+            for keyword in self.scores:
+                self.scores[keyword] /= self.weight
+            self.weight = 1.0
+
+        if len(self.scores) > self.max_keywords:
+            keep = heapq.nlargest(self.max_keywords * 3 // 4, self.scores.items(), key=lambda item: item[1])
+            self.scores = dict(keep)
+            self.counts = {keyword: self.counts[keyword] for keyword in self.scores}
+
+    def top_k(self, k: int = TOP_K) -> List[str]:
+        return [keyword for keyword, _ in self.top_k_scores(k)]
+
+    def top_k_scores(self, k: int = TOP_K) -> List[Tuple[str, float]]:
+        """The `k` best keywords, best first, with scores normalized to the latest weight."""
+        best = heapq.nlargest(k, self.scores.items(), key=lambda item: (item[1], item[0]))
+        latest = self.weight / self.growth
+        return [(keyword, score / latest) for keyword, score in best]
+
+    def count(self, keyword: str) -> int:
+        return self.counts.get(keyword.lower(), 0)
+
+
+class ProjectKeywords:
+    """One `KeywordIndex` per project."""
+
+    def __init__(self, top_k: int = TOP_K, max_keywords: int = MAX_KEYWORDS, decay: float = DECAY):
+        self.k = top_k
+        self.max_keywords = max_keywords
+        self.decay = decay
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, KeywordIndex] = {}
+
+    def add(self, project_name: str, keywords: Iterable[str]):
+        with self._lock:
+            index = self._indexes.get(project_name)
+            if index is None:
+                index = self._indexes[project_name] = KeywordIndex(self.max_keywords, self.decay)
+            index.add(keywords)
+
+    def top_k(self, project_name: str, k: int = None) -> List[str]:
+        with self._lock:
+            index = self._indexes.get(project_name)
+            return index.top_k(k or self.k) if index else []
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from src.config import Config
+from src.llm.stream import stream_inference
+
+MODES = ("off", "read_write", "record", "replay")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+_pending = threading.local()
+
+
+class CacheMiss(Exception):
+    pass
+
+
+class PendingResponses:
+    """Responses of one validated model call, cached only once the caller accepts them."""
+
+    def __init__(self):
+        self.entries = []
+
+    def add(self, llm: "CachedLLM", key: str, response: str, from_cache: bool):
+        self.entries.append((llm, key, response, from_cache))
+
+    def confirm(self):
+        for llm, key, response, from_cache in self.entries:
+            if not from_cache:
+                llm.cache.put(key, llm.model_id, llm.agent, response)
+        self.entries = []
+
+    def reject(self):
+        # A cached answer that failed validation would be served again on the retry.
+        for llm, key, _, from_cache in self.entries:
+            if from_cache and llm.mode != "replay":
+                llm.cache.delete(key)
+        self.entries = []
+
+
+@contextmanager
+def pending_responses():
+    """Hold back cache writes made in this thread until `confirm()`; unconfirmed ones are dropped."""
+    previous = getattr(_pending, "responses", None)
+    _pending.responses = responses = PendingResponses()
+    try:
+        yield responses
+    finally:
+        _pending.responses = previous
+
+
+def cache_key(model_id: str, prompt: str, params: Optional[dict] = None) -> str:
+    digest = hashlib.sha256()
+    digest.update(str(model_id).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(json.dumps(params or {}, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """SQLite store of model responses, evicting least recently used entries past `max_bytes`."""
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        if path is None:
+            path = os.path.join(os.path.dirname(Config().get_sqlite_db()), "llm_cache.db")
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS llm_response (
+                key TEXT PRIMARY KEY, model_id TEXT NOT NULL, agent TEXT, response TEXT NOT NULL,
+                size INTEGER NOT NULL, accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_llm_response_accessed ON llm_response (accessed);
+        """)
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM llm_response WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE llm_response SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_response WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def put(self, key: str, model_id: str, agent: str, response: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO llm_response VALUES (?, ?, ?, ?, ?, ?)",
+                               (key, model_id, agent, response, len(response.encode("utf-8")), time.time()))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_response").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM llm_response ORDER BY accessed").fetchall():
+            self._conn.execute("DELETE FROM llm_response WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+class CachedLLM:
+    """Wraps an `LLM` so `inference` goes through a `ResponseCache`.
+
+    Modes: "read_write" serves hits and stores misses, "record" always calls the model and
+    stores the answer, "replay" only serves from the cache and raises `CacheMiss` otherwise,
+    which lets the agent pipeline run offline without a model.
+
+    Inside `pending_responses()`, as opened by the retry controller around every attempt,
+    answers are only stored once they validate. The key covers the sampling params the
+    client exposes as `sampling_params` plus any keyword arguments of the call.
+    """
+
+    def __init__(self, llm, agent: str, cache: ResponseCache, mode: str = "read_write", params: Optional[dict] = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown LLM cache mode: {mode}")
+        self.llm = llm
+        self.agent = agent
+        self.cache = cache
+        self.mode = mode
+        self.params = params if params is not None else dict(getattr(llm, "sampling_params", None) or {})
+        self.model_id = getattr(llm, "model_id", None)
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: str) -> Optional[str]:
+        if self.mode not in ("read_write", "replay"):
+            return None
+        response = self.cache.get(key)
+        if response is not None:
+            self.hits += 1
+            self._track(key, response, from_cache=True)
+            return response
+        self.misses += 1
+        if self.mode == "replay":
+            raise CacheMiss(f"No recorded response for {self.agent} ({self.model_id})")
+        return None
+
+    def _track(self, key: str, response: str, from_cache: bool):
+        pending = getattr(_pending, "responses", None)
+        if pending is not None:
+            pending.add(self, key, response, from_cache)
+        elif not from_cache:
+            self.cache.put(key, self.model_id, self.agent, response)
+
+    def inference(self, prompt: str, project_name: str, **params) -> str:
+        key = cache_key(self.model_id, prompt, dict(self.params, **params))
+        response = self._lookup(key)
+        if response is not None:
+            return response
+
+        response = self.llm.inference(prompt, project_name, **params)
+        if response:
+            self._track(key, response, from_cache=False)
+        return response
+
+    def stream_inference(self, prompt: str, project_name: str):
+        key = cache_key(self.model_id, prompt, self.params)
+        response = self._lookup(key)
+        if response is not None:
+            yield response
+            return
+
+        chunks = []
+        for chunk in stream_inference(self.llm, prompt, project_name):
+            chunks.append(chunk)
+            yield chunk
+
+        # Only reached when the stream was consumed to the end.
+        response = "".join(chunks)
+        if response:
+            self._track(key, response, from_cache=False)
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def cached_llm(llm, agent: str):
+    """Return `llm` wrapped in the shared response cache if caching is enabled for `agent`.
+
+    "record" and "replay" apply to every agent; "read_write" only to the agents listed
+    under `LLM_CACHE.AGENTS`.
+    """
+    global _shared_cache
+
+    config = Config()
+    mode = config.llm_cache_mode
+    if mode == "off" or (mode == "read_write" and agent not in config.llm_cache_agents):
+        return llm
+
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache()
+    return CachedLLM(llm, agent, _shared_cache, mode)
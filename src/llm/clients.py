@@ -0,0 +1,74 @@
+import threading
+import time
+
+from src.llm.cache import cached_llm
+from src.llm.stream import stream_inference
+from src.metrics import registry
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def shared_llm(model_id: str):
+    """Return the process-wide `LLM` client for `model_id`, creating it on first use.
+
+    Every agent of every `Agent` talks to the same client per model, and the provider
+    SDKs behind `src.llm` are only imported once a model is actually needed.
+    """
+    with _clients_lock:
+        client = _clients.get(model_id)
+        if client is None:
+            from src.llm import LLM
+            client = LLM(model_id=model_id)
+            _clients[model_id] = client
+    return client
+
+
+llm_request_seconds = registry.histogram("devika_llm_request_seconds", "Model call latency.", ("agent", "model"))
+llm_first_chunk_seconds = registry.histogram("devika_llm_first_chunk_seconds",
+                                             "Time to the first streamed chunk.", ("agent", "model"))
+llm_requests_total = registry.counter("devika_llm_requests_total", "Model calls by outcome.",
+                                      ("agent", "model", "status"))
+
+
+class MeteredLLM:
+    """Records latency and outcome of every model call made on behalf of `agent`."""
+
+    def __init__(self, llm, agent: str, model_id: str):
+        self.llm = llm
+        self.agent = agent
+        self.model_id = model_id
+
+    def inference(self, prompt: str, project_name: str, **params) -> str:
+        status = "error"
+        try:
+            with llm_request_seconds.time(agent=self.agent, model=self.model_id):
+                response = self.llm.inference(prompt, project_name, **params)
+            status = "ok"
+            return response
+        finally:
+            llm_requests_total.inc(agent=self.agent, model=self.model_id, status=status)
+
+    def stream_inference(self, prompt: str, project_name: str):
+        started = time.perf_counter()
+        first_chunk = True
+        status = "error"
+        try:
+            for chunk in stream_inference(self.llm, prompt, project_name):
+                if first_chunk:
+                    llm_first_chunk_seconds.observe(time.perf_counter() - started,
+                                                    agent=self.agent, model=self.model_id)
+                    first_chunk = False
+                yield chunk
+            status = "ok"
+        finally:
+            llm_request_seconds.observe(time.perf_counter() - started, agent=self.agent, model=self.model_id)
+            llm_requests_total.inc(agent=self.agent, model=self.model_id, status=status)
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+
+def agent_llm(model_id: str, agent: str):
+    """The client an agent should use: shared per model, metered, and cached if enabled."""
+    return cached_llm(MeteredLLM(shared_llm(model_id), agent, model_id), agent)
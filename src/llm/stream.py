@@ -0,0 +1,52 @@
+import time
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from src.code_parser import CodeParseError
+from src.logger import Logger
+
+
+def stream_inference(llm, prompt: str, project_name: str) -> Iterator[str]:
+    """Yield the completion in chunks, or as one chunk for clients that cannot stream."""
+    stream = getattr(llm, "stream_inference", None)
+    if stream is None:
+        yield llm.inference(prompt, project_name)
+        return
+    yield from stream(prompt, project_name)
+
+
+def stream_files(
+    llm, prompt: str, project_name: str, parser, on_file: Callable[[dict], None]
+) -> Tuple[str, Optional[List[dict]]]:
+    """Stream a completion through `parser`, calling `on_file` for every file as its block closes.
+
+    A malformed stream is abandoned as soon as the parser rejects it. Returns the text
+    received so far and the files the parser produced, or None for the files if it
+    rejected the stream, so callers need not parse the response again.
+    """
+    logger = Logger()
+    chunks = []
+    started = time.perf_counter()
+    first_file_after = None
+    files = []
+
+    stream = stream_inference(llm, prompt, project_name)
+    try:
+        for chunk in stream:
+            chunks.append(chunk)
+            for file_data in parser.feed(chunk):
+                if first_file_after is None:
+                    first_file_after = time.perf_counter() - started
+                files.append(file_data)
+                on_file(file_data)
+        for file_data in parser.close():
+            files.append(file_data)
+            on_file(file_data)
+    except CodeParseError as e:
+        logger.warning(f"Aborted malformed response stream: {e}")
+        files = None
+    finally:
+        stream.close()
+
+    if first_file_after is not None:
+        logger.info(f"Time to first file :: {first_file_after:.2f}s of {time.perf_counter() - started:.2f}s")
+    return "".join(chunks), files
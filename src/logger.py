@@ -1,7 +1,15 @@
+import atexit
 import os
+import queue
+import random
+import threading
+import time
+from functools import wraps
+
 import toml
-from fastlogging import LogInit
-from flask import Flask, request, jsonify
+from fastlogging import DEBUG, ERROR, FATAL, INFO, WARNING, LogInit
+from flask import Flask, Response, request, jsonify, stream_with_context
+from src.metrics import registry
 
 app = Flask(__name__)
 
@@ -38,17 +46,156 @@ class Config:
     def get(self, key, default=None):
         return self.config.get(key, default)
 
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR, "critical": FATAL}
+# Records waiting for the writer thread; beyond this, debug and info records are dropped.
+MAX_QUEUED_RECORDS = 10000
+# The writer flushes the file after at most this many records.
+BATCH_SIZE = 256
+MAX_MESSAGE_CHARS = 4000
+
+records_dropped = registry.counter(
+    "devika_log_records_dropped_total", "Log records dropped before being written.", ("reason",))
+queued_records = registry.gauge("devika_log_queue_depth", "Log records waiting for the writer thread.")
+
+
+def truncate(message: str, limit: int = MAX_MESSAGE_CHARS) -> str:
+    if len(message) <= limit:
+        return message
+    return f"{message[:limit]}... [{len(message) - limit} more chars]"
+
+
 class Logger:
-    def __init__(self, filename="devika_agent.log"):
+    """Shared, queue-backed logger; one instance per log file.
+
+    Logging calls only filter, sample and enqueue a record. A single writer thread
+    formats `message % args`, truncates huge payloads and hands records to fastlogging
+    in batches with one flush per batch, so callers never wait on the disk. Debug and
+    info records are dropped when the queue is full; warnings and errors are always kept.
+    """
+    _instances = {}
+    _instance_lock = threading.Lock()
+
+    def __new__(cls, filename="devika_agent.log"):
+        with cls._instance_lock:
+            instance = cls._instances.get(filename)
+            if instance is None:
+                instance = super().__new__(cls)
+                instance._setup(filename)
+                cls._instances[filename] = instance
+        return instance
+
+    def _setup(self, filename):
         self.config = Config()
         logs_dir = self.config.get("STORAGE.LOGS_DIR", "logs")  # Provide a default value
         log_file_path = os.path.join(logs_dir, filename)
         self.logger = LogInit(pathName=log_file_path, console=True, colors=True, encoding="utf-8")
 
-    def log(self, level, message):
-        log_method = getattr(self.logger, level)
-        log_method(message)
-        self.logger.flush()
+        self.level = LEVELS.get(str(self.config.get("LOGGING.LEVEL", "debug")).lower(), DEBUG)
+        # Fraction of records kept per level, e.g. {"debug": 0.1}; unlisted levels keep all.
+        sample_rates = self.config.get("LOGGING.SAMPLE_RATES", {})
+        self.sample_rates = {LEVELS[name]: float(rate) for name, rate in sample_rates.items() if name in LEVELS}
+        self.max_message_chars = int(self.config.get("LOGGING.MAX_MESSAGE_CHARS", MAX_MESSAGE_CHARS))
+
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_records, name="log-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _enqueue(self, level, message, args):
+        if level < self.level:
+            return
+        rate = self.sample_rates.get(level)
+        if rate is not None and random.random() >= rate:
+            records_dropped.inc(reason="sampled")
+            return
+        record = (time.time(), level, message, args)
+        if self._closed:
+            # Shutting down: nothing drains the queue any more.
+            self._write(record)
+            self.logger.flush()
+            return
+        if level < WARNING and self._queue.qsize() >= MAX_QUEUED_RECORDS:
+            records_dropped.inc(reason="queue_full")
+            return
+        self._queue.put(record)
+
+    def _format(self, message, args) -> str:
+        message = str(message)
+        if args:
+            try:
+                message = message % args
+            except (TypeError, ValueError):
+                message = f"{message} {args!r}"
+        return truncate(message, self.max_message_chars)
+
+    def _write(self, record):
+        created, level, message, args = record
+        try:
+            self.logger.logEntry(created, self.logger.domain, level, self._format(message, args), {})
+        except Exception as e:
+            print(f"Error writing log record: {e}")
+
+    def _write_records(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            waiters = []
+            for record in batch:
+                if record is None:
+                    stop = True
+                elif isinstance(record, threading.Event):
+                    waiters.append(record)
+                else:
+                    self._write(record)
+            self.logger.flush()
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def log(self, level, message, *args):
+        self._enqueue(LEVELS[level], message, args)
+
+    def debug(self, message, *args):
+        self._enqueue(DEBUG, message, args)
+
+    def info(self, message, *args):
+        self._enqueue(INFO, message, args)
+
+    def warning(self, message, *args):
+        self._enqueue(WARNING, message, args)
+
+    def error(self, message, *args):
+        self._enqueue(ERROR, message, args)
+
+    def flush(self, timeout=None) -> bool:
+        """Wait until every record enqueued so far has been written."""
+        if not self._writer.is_alive():
+            return True
+        written = threading.Event()
+        self._queue.put(written)
+        return written.wait(timeout)
+
+    def close(self):
+        self._closed = True
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    @classmethod
+    def queue_depth(cls) -> int:
+        """Records waiting across every log file's writer thread."""
+        return sum(logger._queue.qsize() for logger in list(cls._instances.values()))
+
+
+queued_records.set_function(Logger.queue_depth)
 
 def route_logger(func):
     @wraps(func)
@@ -68,7 +215,10 @@ def route_logger(func):
 
         # Log exit point
         if log_enabled:
-            response_summary = response.get_data(as_text=True) if hasattr(response, "get_data") else str(response)
+            if getattr(response, "is_streamed", False):
+                response_summary = "<streamed>"
+            else:
+                response_summary = response.get_data(as_text=True) if hasattr(response, "get_data") else str(response)
             app.logger.debug(f"{request.path} {request.method} - Response: {response_summary}")
 
         return response
@@ -80,5 +230,41 @@ def get_data():
     message = {"status": "success", "data": "some data"}
     return jsonify(message)
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/download-project", methods=["GET"])
+@route_logger
+def download_project():
+    # Imported here: src.project pulls in modules that import this one.
+    from src.project import ProjectManager
+
+    project_name = request.args.get("project_name")
+    if not project_name:
+        return jsonify({"error": "project_name is required"}), 400
+    project_manager = ProjectManager()
+    chunks = project_manager.stream_project_zip(project_name)
+    if chunks is None:
+        return jsonify({"error": "project not found"}), 404
+    filename = os.path.basename(project_manager.get_zip_path(project_name))
+    return Response(
+        stream_with_context(chunks),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+@app.route("/api/agent-state-snapshot", methods=["GET"])
+@route_logger
+def agent_state_snapshot():
+    # Imported here: src.state pulls in modules that import this one.
+    from src.state import AgentState
+
+    project_name = request.args.get("project_name")
+    if not project_name:
+        return jsonify({"error": "project_name is required"}), 400
+    since_index = request.args.get("since_index", 0, type=int)
+    return jsonify(AgentState().get_state_snapshot(project_name, since_index))
+
 if __name__ == "__main__":
     app.run(debug=True)
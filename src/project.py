@@ -1,28 +1,83 @@
 import os
 import json
-import zipfile
+import threading
 from datetime import datetime
-from typing import Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import create_engine, select
-from src.socket_instance import emit_agent
+from typing import Iterator, Optional
+from sqlalchemy import Index
+from sqlmodel import Field, Session, SQLModel, select
+from src.socket_instance import emit_agent, socketio
 from src.config import Config
-from sqlmodel import SQLModel, Field, Relationship
+from src.database import get_engine
+from src.filesystem.archive import ZipExporter
+from src.metrics import registry
+
+project_write_seconds = registry.histogram("devika_project_write_seconds", "Project DB write latency.", ("op",))
+project_messages_total = registry.counter("devika_project_messages_total", "Messages stored.", ("sender",))
 
 
 class Projects(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    project: str = Field(index=True)
+    # Legacy message history, only read to migrate old databases.
+    message_stack_json: str = "[]"
+
+
+class ProjectMessage(SQLModel, table=True):
+    __tablename__ = "project_message"
+    __table_args__ = (Index("ix_project_message_project_id", "project", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     project: str
-    message_stack_json: str
+    from_devika: bool
+    message: str
+    timestamp: str
+
+
+def _message_dict(row: ProjectMessage) -> dict:
+    return {"id": row.id, "from_devika": row.from_devika, "message": row.message, "timestamp": row.timestamp}
+
+
+def format_message(message: dict) -> str:
+    return f"Devika: {message['message']}" if message["from_devika"] else f"User: {message['message']}"
 
 
 class ProjectManager:
-    def __init__(self):
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance._setup()
+                cls._instance = instance
+        return cls._instance
+
+    def _setup(self):
         self.config = Config()
         sqlite_path = self.config.get("STORAGE.SQLITE_DB")
         self.project_path = self.config.get("STORAGE.PROJECTS_DIR")
-        self.engine = create_engine(f"sqlite:///{sqlite_path}")
-        SQLModel.metadata.create_all(self.engine)
+        self.engine = get_engine(sqlite_path)
+        self.zip_exporter = ZipExporter()
+        # `create_all` skips indexes on tables that already exist.
+        for index in Projects.__table__.indexes:
+            index.create(self.engine, checkfirst=True)
+        self._migrate_message_stacks()
+
+    def _migrate_message_stacks(self):
+        """Move every legacy `message_stack_json` blob into one row per message."""
+        with Session(self.engine) as session:
+            legacy_projects = session.exec(select(Projects).where(Projects.message_stack_json != "[]")).all()
+            for project_state in legacy_projects:
+                for message in json.loads(project_state.message_stack_json):
+                    session.add(ProjectMessage(project=project_state.project,
+                                               from_devika=message["from_devika"],
+                                               message=message["message"],
+                                               timestamp=message["timestamp"]))
+                project_state.message_stack_json = "[]"
+                session.add(project_state)
+            if legacy_projects:
+                session.commit()
 
     def new_message(self):
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -34,79 +89,119 @@ class ProjectManager:
 
     def create_project(self, project: str):
         with Session(self.engine) as session:
-            project_state = Projects(project=project, message_stack_json=json.dumps([]))
-            session.add(project_state)
-            session.commit()
+            session.add(Projects(project=project))
+            with project_write_seconds.time(op="create_project"):
+                session.commit()
 
     def _get_project(self, session: Session, project: str) -> Optional[Projects]:
         return session.exec(select(Projects).where(Projects.project == project)).first()
 
-    def _update_message_stack(self, session: Session, project_state: Projects, message_stack: list):
-        project_state.message_stack_json = json.dumps(message_stack)
-        session.add(project_state)
-        session.commit()
-
-    def add_message_to_project(self, project: str, message: dict):
+    def add_message_to_project(self, project: str, message: dict) -> dict:
         with Session(self.engine) as session:
-            project_state = self._get_project(session, project)
-            if project_state:
-                message_stack = json.loads(project_state.message_stack_json)
-                message_stack.append(message)
-            else:
-                message_stack = [message]
-                project_state = Projects(project=project, message_stack_json=json.dumps(message_stack))
-            self._update_message_stack(session, project_state, message_stack)
+            if self._get_project(session, project) is None:
+                session.add(Projects(project=project))
+            row = ProjectMessage(project=project, from_devika=message["from_devika"],
+                                 message=message["message"], timestamp=message["timestamp"])
+            session.add(row)
+            with project_write_seconds.time(op="add_message"):
+                session.commit()
+            project_messages_total.inc(sender="devika" if row.from_devika else "user")
+            return _message_dict(row)
 
     def add_message_from_devika(self, project: str, message: str):
         new_message = self.new_message()
         new_message["message"] = message
-        emit_agent("server-message", {"messages": new_message})
-        self.add_message_to_project(project, new_message)
+        emit_agent("server-message", {"messages": self.add_message_to_project(project, new_message),
+                                      "project_name": project})
 
     def add_message_from_user(self, project: str, message: str):
         new_message = self.new_message()
         new_message["message"] = message
         new_message["from_devika"] = False
-        emit_agent("server-message", {"messages": new_message})
-        self.add_message_to_project(project, new_message)
+        emit_agent("server-message", {"messages": self.add_message_to_project(project, new_message),
+                                      "project_name": project})
+
+    def get_messages(self, project: str, after: Optional[int] = None, limit: Optional[int] = None) -> Optional[list]:
+        """Messages in order, starting after message id `after`; None for an unknown project.
 
-    def get_messages(self, project: str) -> Optional[list]:
+        Pass the `id` of the last message received as `after` to fetch the next page.
+        """
         with Session(self.engine) as session:
-            project_state = self._get_project(session, project)
-            if project_state:
-                return json.loads(project_state.message_stack_json)
-            return None
+            if self._get_project(session, project) is None:
+                return None
+            query = select(ProjectMessage).where(ProjectMessage.project == project)
+            if after is not None:
+                query = query.where(ProjectMessage.id > after)
+            query = query.order_by(ProjectMessage.id)
+            if limit is not None:
+                query = query.limit(limit)
+            return [_message_dict(row) for row in session.exec(query).all()]
+
+    def tail(self, project: str, n: int) -> list:
+        """The last `n` messages of `project`, oldest first."""
+        with Session(self.engine) as session:
+            rows = session.exec(
+                select(ProjectMessage)
+                .where(ProjectMessage.project == project)
+                .order_by(ProjectMessage.id.desc())
+                .limit(n)
+            ).all()
+            return [_message_dict(row) for row in reversed(rows)]
 
     def get_project_list(self) -> list:
         with Session(self.engine) as session:
-            projects = session.exec(select(Projects)).all()
-            return [project.project for project in projects]
+            return list(session.exec(select(Projects.project)).all())
 
     def get_all_messages_formatted(self, project: str) -> list:
-        formatted_messages = []
+        return [format_message(message) for message in self.get_messages(project) or []]
+
+    def project_exists(self, project: str) -> bool:
         with Session(self.engine) as session:
-            project_state = self._get_project(session, project)
-            if project_state:
-                message_stack = json.loads(project_state.message_stack_json)
-                for message in message_stack:
-                    formatted_messages.append(f"Devika: {message['message']}" if message['from_devika']
-                                              else f"User: {message['message']}")
-            return formatted_messages
+            return self._get_project(session, project) is not None
 
     def get_project_path(self, project: str) -> str:
-        return os.path.join(self.project_path, project.lower().replace(" ", "-"))
+        """The project's directory; raises ValueError for a name that resolves outside the projects dir."""
+        project_path = os.path.join(self.project_path, project.lower().replace(" ", "-"))
+        root = os.path.realpath(self.project_path)
+        resolved = os.path.realpath(project_path)
+        if resolved == root or os.path.commonpath([root, resolved]) != root:
+            raise ValueError(f"Project path escapes the projects directory: {project!r}")
+        return project_path
+
+    def _export_paths(self, project: str) -> Optional[tuple]:
+        """(project_path, zip_path) of a known project with a directory, else None."""
+        if not self.project_exists(project):
+            return None
+        try:
+            project_path = self.get_project_path(project)
+        except ValueError:
+            return None
+        if not os.path.isdir(project_path):
+            return None
+        return project_path, f"{project_path}.zip"
 
     def project_to_zip(self, project: str) -> Optional[str]:
-        project_path = self.get_project_path(project)
-        zip_path = f"{project_path}.zip"
+        paths = self._export_paths(project)
+        if paths is None:
+            return None
+        zip_path = self.zip_exporter.export(*paths)
+        return zip_path if os.path.exists(zip_path) else None
 
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(project_path):
-                for file in files:
-                    relative_path = os.path.relpath(os.path.join(root, file), os.path.join(project_path, '..'))
-                    zipf.write(os.path.join(root, file), arcname=relative_path)
+    def stream_project_zip(self, project: str) -> Optional[Iterator[bytes]]:
+        """Archive chunks for `project`; None for an unknown project or one without files.
 
-        return zip_path if os.path.exists(zip_path) else None
+        Nothing is written next to the projects directory unless the project is valid.
+        """
+        paths = self._export_paths(project)
+        if paths is None:
+            return None
+        return self.zip_exporter.stream(*paths)
 
     def get_zip_path(self, project: str) -> str:
         return f"{self.get_project_path(project)}.zip"
+
+
+@socketio.on("server-messages")
+def handle_server_messages_request(data: dict) -> Optional[list]:
+    """Answer a client that received a "server-message" snapshot marker with the messages after `after`."""
+    return ProjectManager().get_messages(data["project_name"], data.get("after"))
@@ -0,0 +1,71 @@
+import os
+import threading
+import time
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from src.config import Config
+
+PROMPTS_DIR = "src/agents"
+PROMPT_FILE = "prompt.jinja2"
+
+
+class PromptRegistry:
+    """Compiles every `src/agents/*/prompt.jinja2` once for all agents.
+
+    Compiled templates are kept in a bytecode cache on disk, so a fresh process skips the
+    Jinja compile step, and a template is only reloaded after its file's mtime changed.
+    """
+
+    def __init__(self, prompts_dir: str = PROMPTS_DIR, cache_dir: str = None):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(Config().get_sqlite_db()), "jinja_cache")
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.prompts_dir = prompts_dir
+        self.env = Environment(
+            loader=FileSystemLoader(prompts_dir),
+            bytecode_cache=FileSystemBytecodeCache(cache_dir),
+            auto_reload=True
+        )
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+
+    def preload(self):
+        for agent in sorted(os.listdir(self.prompts_dir)):
+            if os.path.isfile(os.path.join(self.prompts_dir, agent, PROMPT_FILE)):
+                self.env.get_template(f"{agent}/{PROMPT_FILE}")
+
+    def render(self, agent: str, **context) -> str:
+        started = time.perf_counter()
+        rendered = self.env.get_template(f"{agent}/{PROMPT_FILE}").render(**context)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._stats_lock:
+            stats = self._stats.setdefault(agent, {"renders": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["renders"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        return rendered
+
+    def get_render_stats(self) -> dict:
+        with self._stats_lock:
+            return {agent: dict(stats) for agent, stats in self._stats.items()}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_prompt_registry() -> PromptRegistry:
+    global _registry
+
+    with _registry_lock:
+        if _registry is None:
+            _registry = PromptRegistry()
+            _registry.preload()
+    return _registry
+
+
+def render_prompt(agent: str, **context) -> str:
+    return get_prompt_registry().render(agent, **context)
@@ -0,0 +1,2 @@
+from .pipeline import ResearchPipeline, EventLoopThread
+from .cache import ResearchCache
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from src.config import Config
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResearchCache:
+    """On-disk cache shared by all projects: query -> first link, (url, page hash) -> formatted text.
+
+    Entries expire after `ttl` seconds; when the stored text exceeds `max_bytes` the least
+    recently used entries are evicted.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES):
+        if path is None:
+            path = os.path.join(os.path.dirname(Config().get_sqlite_db()), "research_cache.db")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = {"link_hits": 0, "link_misses": 0, "format_hits": 0, "format_misses": 0}
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS research_link (
+                query TEXT PRIMARY KEY, link TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS research_formatted (
+                url TEXT NOT NULL, page_hash TEXT NOT NULL, formatted TEXT NOT NULL, size INTEGER NOT NULL,
+                created REAL NOT NULL, accessed REAL NOT NULL, PRIMARY KEY (url, page_hash)
+            );
+            CREATE INDEX IF NOT EXISTS ix_research_formatted_accessed ON research_formatted (accessed);
+        """)
+        self._conn.commit()
+
+    def _get(self, sql: str, params: tuple, table: str, where: str, stat: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(sql, params).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.stats[f"{stat}_misses"] += 1
+                return None
+            self._conn.execute(f"UPDATE {table} SET accessed = ? WHERE {where}", (now, *params))
+            self._conn.commit()
+            self.stats[f"{stat}_hits"] += 1
+            return row[0]
+
+    def get_link(self, query: str) -> Optional[str]:
+        return self._get("SELECT link, created FROM research_link WHERE query = ?",
+                         (normalize_query(query),), "research_link", "query = ?", "link")
+
+    def put_link(self, query: str, link: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO research_link VALUES (?, ?, ?, ?)",
+                               (normalize_query(query), link, now, now))
+            self._conn.commit()
+
+    def get_formatted(self, url: str, page_text: str) -> Optional[str]:
+        return self._get("SELECT formatted, created FROM research_formatted WHERE url = ? AND page_hash = ?",
+                         (url, content_hash(page_text)), "research_formatted", "url = ? AND page_hash = ?",
+                         "format")
+
+    def put_formatted(self, url: str, page_text: str, formatted: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO research_formatted VALUES (?, ?, ?, ?, ?, ?)",
+                               (url, content_hash(page_text), formatted, len(formatted.encode("utf-8")), now, now))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        self._conn.execute("DELETE FROM research_link WHERE created < ?", (time.time() - self.ttl,))
+        self._conn.execute("DELETE FROM research_formatted WHERE created < ?", (time.time() - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM research_formatted").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, page_hash, size in self._conn.execute(
+                "SELECT url, page_hash, size FROM research_formatted ORDER BY accessed").fetchall():
+            self._conn.execute("DELETE FROM research_formatted WHERE url = ? AND page_hash = ?", (url, page_hash))
+            total -= size
+            if total <= self.max_bytes:
+                break
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from src.logger import Logger
+from src.research.cache import ResearchCache
+
+
+class EventLoopThread:
+    """A single asyncio loop running in a daemon thread, reused for every research run."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="research-loop", daemon=True)
+        self._thread.start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+class ResearchPipeline:
+    """Runs search -> page fetch -> format for many queries at once.
+
+    `new_search` returns a fresh search engine (they keep per-query results), `open_page`
+    is a coroutine returning `(raw_screenshot, text)` for a URL and `format_text` is the
+    blocking formatter call. At most `concurrency` queries are in flight. With a `cache`,
+    known query links skip the search and already formatted pages skip the formatter.
+    """
+
+    def __init__(
+        self,
+        new_search: Callable,
+        open_page: Callable,
+        format_text: Callable,
+        concurrency: int = 4,
+        on_screenshot: Optional[Callable] = None,
+        cache: Optional[ResearchCache] = None
+    ):
+        self.new_search = new_search
+        self.open_page = open_page
+        self.format_text = format_text
+        self.concurrency = concurrency
+        self.on_screenshot = on_screenshot
+        self.cache = cache
+        self.logger = Logger()
+        self.timings: Dict[str, Dict[str, float]] = {}
+
+    async def _search(self, query: str) -> str:
+        if self.cache:
+            link = self.cache.get_link(query)
+            if link:
+                return link
+
+        web_search = self.new_search()
+        await asyncio.to_thread(web_search.search, query)
+        link = web_search.get_first_link()
+        if self.cache and link:
+            self.cache.put_link(query, link)
+        return link
+
+    async def _format(self, link: str, data: str, project_name: str) -> str:
+        if self.cache:
+            formatted = self.cache.get_formatted(link, data)
+            if formatted is not None:
+                return formatted
+
+        formatted = await asyncio.to_thread(self.format_text, data, project_name)
+        if self.cache and formatted:
+            self.cache.put_formatted(link, data, formatted)
+        return formatted
+
+    async def _research_one(self, query: str, project_name: str, semaphore: asyncio.Semaphore) -> str:
+        timings = self.timings.setdefault(query, {})
+        async with semaphore:
+            try:
+                started = time.perf_counter()
+                link = await self._search(query)
+                timings["search"] = time.perf_counter() - started
+                self.logger.info(f"Link :: {link}")
+
+                started = time.perf_counter()
+                raw, data = await self.open_page(project_name, link)
+                timings["fetch"] = time.perf_counter() - started
+                if self.on_screenshot:
+                    self.on_screenshot(raw, project_name)
+
+                started = time.perf_counter()
+                result = await self._format(link, data, project_name)
+                timings["format"] = time.perf_counter() - started
+            except Exception as e:
+                self.logger.error(f"Research failed for query '{query}': {e}")
+                return ""
+
+        self.logger.info(f"Got search results for: {query}")
+        return result
+
+    async def run(self, queries: List[str], project_name: str) -> dict:
+        self.timings = {}
+        queries = [query.strip().lower() for query in queries]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(
+            *(self._research_one(query, project_name, semaphore) for query in queries)
+        )
+        return dict(zip(queries, results))
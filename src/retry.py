@@ -0,0 +1,138 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from src.llm.cache import pending_responses
+from src.logger import Logger
+from src.metrics import registry
+
+REPAIR_PROMPT = (
+    "\n\nYour previous response could not be parsed. Reply again and follow the required "
+    "response format exactly, without any extra text."
+)
+
+
+retry_events_total = registry.counter("devika_retry_events_total",
+                                      "Validated model calls, attempts, failures, wasted tokens and exhaustions.",
+                                      ("agent", "event"))
+
+
+class RetryExhausted(Exception):
+    pass
+
+
+class RetryController:
+    """Re-asks the model while its output fails validation, within hard limits.
+
+    Each agent call gets at most `max_attempts` tries with exponential backoff between them;
+    from attempt `repair_after` on, a repair note is appended to the prompt. Failed attempts
+    are charged to a per-project budget of wasted tokens and seconds, and counted per agent.
+    `infer` must not leave side effects behind for a response that fails validation; the
+    streaming code agents stage their files, roll back their provisional states in that
+    case, and the LLM response cache only keeps answers that validated.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        repair_after: int = 2,
+        token_budget: int = 50000,
+        time_budget: float = 600.0
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.repair_after = repair_after
+        self.token_budget = token_budget
+        self.time_budget = time_budget
+
+        self.logger = Logger()
+        self._tokenizer = None
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._spent = {}
+
+    def _count_tokens(self, text: str) -> int:
+        # Only failed attempts are measured, so the encoder is loaded on first failure.
+        if self._tokenizer is None:
+            import tiktoken
+            self._tokenizer = tiktoken.get_encoding("cl100k_base")
+        return len(self._tokenizer.encode(text))
+
+    def _count(self, agent: str, **deltas):
+        with self._lock:
+            metrics = self._metrics.setdefault(agent, {"calls": 0, "attempts": 0, "failures": 0,
+                                                       "wasted_tokens": 0, "exhausted": 0})
+            for name, value in deltas.items():
+                metrics[name] += value
+        for name, value in deltas.items():
+            retry_events_total.inc(value, agent=agent, event=name)
+
+    def _charge(self, project_name: str, tokens: int, seconds: float) -> dict:
+        with self._lock:
+            spent = self._spent.setdefault(project_name, {"tokens": 0, "seconds": 0.0})
+            spent["tokens"] += tokens
+            spent["seconds"] += seconds
+            return dict(spent)
+
+    def run(self, agent: str, project_name: str, prompt: str, infer: Callable[[str], object],
+            validate: Optional[Callable[[str], object]] = None):
+        """Call `infer` until `validate` returns a truthy value, and return that value.
+
+        Without `validate`, `infer` validates the response itself and returns a
+        `(response, validated)` pair.
+        """
+        self._count(agent, calls=1)
+
+        for attempt in range(1, self.max_attempts + 1):
+            attempt_prompt = prompt + REPAIR_PROMPT if attempt > self.repair_after else prompt
+            started = time.perf_counter()
+            with pending_responses() as responses:
+                if validate is None:
+                    response, valid_response = infer(attempt_prompt)
+                else:
+                    response = infer(attempt_prompt)
+                    valid_response = validate(response)
+                if valid_response:
+                    responses.confirm()
+                else:
+                    responses.reject()
+            self._count(agent, attempts=1)
+            if valid_response:
+                return valid_response
+
+            wasted_tokens = self._count_tokens(attempt_prompt) + self._count_tokens(response or "")
+            self._count(agent, failures=1, wasted_tokens=wasted_tokens)
+            spent = self._charge(project_name, wasted_tokens, time.perf_counter() - started)
+            if spent["tokens"] > self.token_budget or spent["seconds"] > self.time_budget:
+                self._count(agent, exhausted=1)
+                raise RetryExhausted(f"{agent}: retry budget of project '{project_name}' exhausted ({spent})")
+
+            if attempt < self.max_attempts:
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+                self.logger.warning(f"{agent}: invalid response from the model (attempt {attempt}), "
+                                    f"retrying in {delay:.1f}s...")
+                time.sleep(delay)
+                self._charge(project_name, 0, delay)
+
+        self._count(agent, exhausted=1)
+        raise RetryExhausted(f"{agent}: no valid response after {self.max_attempts} attempts")
+
+    def get_metrics(self, agent: Optional[str] = None) -> dict:
+        with self._lock:
+            if agent is not None:
+                return dict(self._metrics.get(agent, {}))
+            return {name: dict(metrics) for name, metrics in self._metrics.items()}
+
+    def get_spent(self, project_name: str) -> dict:
+        with self._lock:
+            return dict(self._spent.get(project_name, {"tokens": 0, "seconds": 0.0}))
+
+    def reset_budget(self, project_name: str):
+        with self._lock:
+            self._spent.pop(project_name, None)
+
+
+retry_controller = RetryController()
@@ -0,0 +1,272 @@
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from src.config import Config
+from src.logger import Logger
+from src.state import AgentState
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+# Finished jobs kept around for status queries.
+MAX_FINISHED_JOBS = 1000
+
+QUEUED = "queued"
+RUNNING = "running"
+CANCELLING = "cancelling"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_current = threading.local()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def check_cancelled():
+    """Raise `JobCancelled` if the job running in this thread has been cancelled.
+
+    Long pipelines call this between stages; outside a scheduled job it does nothing.
+    """
+    job = getattr(_current, "job", None)
+    if job is not None and job.cancel_requested.is_set():
+        raise JobCancelled(job.id)
+
+
+class Job:
+    def __init__(self, project: Optional[str], fn: Callable, args: tuple, kwargs: dict, priority: int):
+        self.id = uuid.uuid4().hex
+        self.project = project
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = threading.Event()
+        self.done = threading.Event()
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "project": self.project,
+            "priority": self.priority,
+            "status": self.status,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+    def wait(self, timeout: Optional[float] = None):
+        self.done.wait(timeout)
+        return self.result
+
+
+class AgentScheduler:
+    """Runs agent jobs on a bounded pool of worker threads.
+
+    Jobs of the same project run one at a time in priority order (lower first, then
+    submission order); jobs of different projects run in parallel. Only the head job of
+    each idle project sits in the ready heap, so picking the next job is O(log n).
+    Queued jobs can be cancelled outright; running ones are asked to stop at their next
+    `check_cancelled()` call. Every job's status is stored in `AgentState` under its id.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.logger = Logger()
+
+        self._condition = threading.Condition()
+        self._order = itertools.count()
+        self._ready = []
+        self._waiting = {}
+        self._busy = set()
+        self._jobs = {}
+        self._finished = deque()
+        self._workers = []
+        self._shutdown = False
+        # Statuses are read and written under this lock, so a slower publisher can never
+        # store an older status over a newer one.
+        self._publish_lock = threading.Lock()
+
+    def _start_workers(self):
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._run, name=f"agent-worker-{len(self._workers)}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _project_key(self, job: Job) -> str:
+        # Jobs that create their project have no name yet and need no serialization.
+        return job.project if job.project is not None else job.id
+
+    def _publish(self, job: Job):
+        if job.project is not None:
+            try:
+                with self._publish_lock:
+                    AgentState().set_job_status(job.project, job.to_dict())
+            except Exception as e:
+                self.logger.error(f"Could not record job {job.id} status: {e}")
+
+    def submit(self, project: Optional[str], fn: Callable, *args, priority: int = PRIORITY_NORMAL, **kwargs) -> Job:
+        job = Job(project, fn, args, kwargs, priority)
+        key = self._project_key(job)
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Scheduler is shut down")
+            self._jobs[job.id] = job
+            entry = (priority, next(self._order), job)
+            if key in self._busy or key in self._waiting:
+                heapq.heappush(self._waiting.setdefault(key, []), entry)
+                self._promote(key)
+            else:
+                heapq.heappush(self._ready, entry)
+                self._busy.add(key)
+            self._start_workers()
+            self._condition.notify()
+        self._publish(job)
+        return job
+
+    def submit_execute(self, agent, prompt: str, project_name: str = None, priority: int = PRIORITY_NORMAL) -> Job:
+        return self.submit(project_name, agent.execute, prompt, project_name, priority=priority)
+
+    def submit_subsequent_execute(self, agent, prompt: str, project_name: str,
+                                  priority: int = PRIORITY_NORMAL) -> Job:
+        return self.submit(project_name, agent.subsequent_execute, prompt, project_name, priority=priority)
+
+    def _promote(self, key: str):
+        """Move the next waiting job of `key` to the ready heap if the project is idle."""
+        if key in self._busy:
+            return
+        waiting = self._waiting.get(key)
+        while waiting:
+            entry = heapq.heappop(waiting)
+            if entry[2].status == QUEUED:
+                heapq.heappush(self._ready, entry)
+                self._busy.add(key)
+                break
+        if not waiting:
+            self._waiting.pop(key, None)
+
+    def _take(self) -> Optional[Job]:
+        with self._condition:
+            while True:
+                while self._ready:
+                    job = heapq.heappop(self._ready)[2]
+                    if job.status == QUEUED:
+                        job.status = RUNNING
+                        job.started_at = time.time()
+                        return job
+                    # Cancelled while queued: free the project for its next job.
+                    key = self._project_key(job)
+                    self._busy.discard(key)
+                    self._promote(key)
+                if self._shutdown:
+                    return None
+                self._condition.wait()
+
+    def _forget_finished(self, job: Job):
+        self._finished.append(job.id)
+        while len(self._finished) > MAX_FINISHED_JOBS:
+            self._jobs.pop(self._finished.popleft(), None)
+
+    def _finish(self, job: Job):
+        key = self._project_key(job)
+        with self._condition:
+            self._busy.discard(key)
+            self._promote(key)
+            self._forget_finished(job)
+            self._condition.notify()
+        job.done.set()
+        self._publish(job)
+
+    def _run(self):
+        while True:
+            job = self._take()
+            if job is None:
+                return
+            self._publish(job)
+
+            _current.job = job
+            try:
+                job.result = job.fn(*job.args, **job.kwargs)
+                job.status = CANCELLED if job.cancel_requested.is_set() else COMPLETED
+            except JobCancelled:
+                job.status = CANCELLED
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(e)
+                self.logger.error(f"Job {job.id} for {job.project} failed: {e}")
+            finally:
+                _current.job = None
+                job.finished_at = time.time()
+            self._finish(job)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job, or ask a running one to stop. False if it already finished."""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in (QUEUED, RUNNING):
+                return False
+            job.cancel_requested.set()
+            if job.status == QUEUED:
+                job.status = CANCELLED
+                job.finished_at = time.time()
+                job.done.set()
+                self._forget_finished(job)
+                # A cancelled job at the head of the ready heap still holds its project.
+                self._condition.notify()
+            else:
+                job.status = CANCELLING
+        self._publish(job)
+        return True
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        return job.to_dict() if job else None
+
+    def get_jobs(self, project: str = None) -> List[dict]:
+        with self._condition:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in jobs if project is None or job.project == project]
+
+    def queue_depth(self) -> Dict[str, int]:
+        with self._condition:
+            return {
+                "ready": sum(1 for entry in self._ready if entry[2].status == QUEUED),
+                "waiting": sum(1 for waiting in self._waiting.values() for entry in waiting
+                               if entry[2].status == QUEUED),
+                "running": sum(1 for job in self._jobs.values() if job.status in (RUNNING, CANCELLING))
+            }
+
+    def shutdown(self, wait: bool = True):
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> AgentScheduler:
+    """Return the process-wide scheduler, starting its workers on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = AgentScheduler(max_workers=Config().agent_workers)
+        return _scheduler
@@ -1,112 +1,207 @@
-import os
-import json
-import zipfile
-from datetime import datetime
-from typing import Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import create_engine, select
-from src.socket_instance import emit_agent
-from src.config import Config
-from sqlmodel import SQLModel, Field, Relationship
-
-
-class Projects(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    project: str
-    message_stack_json: str
-
-
-class ProjectManager:
-    def __init__(self):
-        self.config = Config()
-        sqlite_path = self.config.get("STORAGE.SQLITE_DB")
-        self.project_path = self.config.get("STORAGE.PROJECTS_DIR")
-        self.engine = create_engine(f"sqlite:///{sqlite_path}")
-        SQLModel.metadata.create_all(self.engine)
-
-    def new_message(self):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+import atexit
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from flask_socketio import SocketIO
+from src.logger import Logger
+from src.metrics import registry
+
+socketio = SocketIO(cors_allowed_origins="*", async_mode="gevent")
+logger = Logger()
+
+socket_events_total = registry.counter("devika_socket_events_total", "Socket events sent, by channel.", ("channel",))
+socket_send_errors_total = registry.counter("devika_socket_send_errors_total", "Socket events that failed to send.",
+                                            ("channel",))
+
+
+# Events on these channels can be replaced by a "snapshot" marker: the client refetches
+# what the marker covers ("agent-state-snapshot" and "server-messages" socket requests).
+RECOVERABLE_CHANNELS = ("agent-state", "server-message")
+
+
+class BufferedEmitter:
+    """Queues socket events and sends them from a background thread.
+
+    An "agent-state" delta is coalesced into the pending delta for the same entry only
+    while that is the project's most recent pending delta, so a project's deltas always
+    leave in seq order. Only the latest pending status of each job is kept. Emitting
+    never blocks the caller. When more than `max_pending` events wait:
+
+    - screenshot frames have their own bounded queue and the oldest is dropped first;
+    - the pending "agent-state" deltas or "server-message" events of a project collapse
+      into one "snapshot" marker, largest group first, until the queue fits again;
+    - if that is not enough, the oldest event of any other channel is dropped.
+
+    The queue therefore holds at most `max_pending` events, plus one marker per project
+    when every pending event is already a marker.
+    """
+
+    def __init__(self, send, coalesce_window=0.05, flush_size=64, max_pending=1024, max_screenshots=8):
+        self.send = send
+        self.coalesce_window = coalesce_window
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+
+        self._pending = OrderedDict()
+        self._latest_state = {}
+        self._screenshots = deque(maxlen=max_screenshots)
+        self._unique_keys = itertools.count()
+        self._condition = threading.Condition()
+        self._oldest_at = None
+        self.dropped = 0
+        self.collapsed = 0
+
+        self._worker = threading.Thread(target=self._run, name="socket-emitter", daemon=True)
+        self._worker.start()
+
+    def _merge_key(self, channel, content):
+        """The pending slot `content` may replace, or None to queue it as a new event."""
+        if not isinstance(content, dict):
+            return None
+        if channel == "agent-state" and content.get("op") in ("append", "replace"):
+            # Merging into an older slot would send this delta ahead of newer ones.
+            slot, index = self._latest_state.get(content["project_name"], (None, None))
+            return slot if index == content["index"] else None
+        if channel == "job-status" and "id" in content:
+            return (channel, content["id"])
+        return None
+
+    def _marker(self, channel, project, events):
+        if channel == "agent-state":
+            # Covers the seqs of the deltas it replaces; the client requests a snapshot
+            # from `index` on, as it does after a gap.
+            return {
+                "project_name": project,
+                "op": "snapshot",
+                "index": min(event["index"] for event in events),
+                "seq": max(event["seq"] for event in events),
+                "prev_seq": min(event.get("prev_seq", event["seq"] - 1) for event in events),
+            }
+        # The client fetches the project's messages with an id greater than `after`.
         return {
-            "from_devika": True,
-            "message": None,
-            "timestamp": timestamp
+            "project_name": project,
+            "op": "snapshot",
+            "after": min(event["after"] if event.get("op") == "snapshot" else event["messages"]["id"] - 1
+                         for event in events),
         }
 
-    def create_project(self, project: str):
-        with Session(self.engine) as session:
-            project_state = Projects(project=project, message_stack_json=json.dumps([]))
-            session.add(project_state)
-            session.commit()
-
-    def _get_project(self, session: Session, project: str) -> Optional[Projects]:
-        return session.exec(select(Projects).where(Projects.project == project)).first()
-
-    def _update_message_stack(self, session: Session, project_state: Projects, message_stack: list):
-        project_state.message_stack_json = json.dumps(message_stack)
-        session.add(project_state)
-        session.commit()
-
-    def add_message_to_project(self, project: str, message: dict):
-        with Session(self.engine) as session:
-            project_state = self._get_project(session, project)
-            if project_state:
-                message_stack = json.loads(project_state.message_stack_json)
-                message_stack.append(message)
+    def _collapse(self) -> bool:
+        """Replace the largest group of one project's recoverable events with a marker."""
+        groups = {}
+        for key, (channel, content, _) in self._pending.items():
+            if channel in RECOVERABLE_CHANNELS and isinstance(content, dict) and "project_name" in content:
+                groups.setdefault((channel, content["project_name"]), []).append(key)
+        if not groups:
+            return False
+        (channel, project), keys = max(groups.items(), key=lambda item: len(item[1]))
+        if len(keys) < 2:
+            return False
+
+        events = [self._pending.pop(key)[1] for key in keys]
+        marker_key = (channel, project, "snapshot", next(self._unique_keys))
+        self._pending[marker_key] = (channel, self._marker(channel, project, events), False)
+        if channel == "agent-state":
+            self._latest_state[project] = (marker_key, None)
+        self.collapsed += len(events) - 1
+        return True
+
+    def _make_room(self):
+        while len(self._pending) >= self.max_pending and self._collapse():
+            pass
+        if len(self._pending) < self.max_pending:
+            return
+        for key, (channel, _, _) in self._pending.items():
+            if channel not in RECOVERABLE_CHANNELS:
+                del self._pending[key]
+                self.dropped += 1
+                return
+
+    def emit(self, channel, content, log=True) -> bool:
+        with self._condition:
+            if channel == "screenshot":
+                if len(self._screenshots) == self._screenshots.maxlen:
+                    self.dropped += 1
+                self._screenshots.append((channel, content, log))
             else:
-                message_stack = [message]
-                project_state = Projects(project=project, message_stack_json=json.dumps(message_stack))
-            self._update_message_stack(session, project_state, message_stack)
-
-    def add_message_from_devika(self, project: str, message: str):
-        new_message = self.new_message()
-        new_message["message"] = message
-        emit_agent("server-message", {"messages": new_message})
-        self.add_message_to_project(project, new_message)
-
-    def add_message_from_user(self, project: str, message: str):
-        new_message = self.new_message()
-        new_message["message"] = message
-        new_message["from_devika"] = False
-        emit_agent("server-message", {"messages": new_message})
-        self.add_message_to_project(project, new_message)
-
-    def get_messages(self, project: str) -> Optional[list]:
-        with Session(self.engine) as session:
-            project_state = self._get_project(session, project)
-            if project_state:
-                return json.loads(project_state.message_stack_json)
-            return None
-
-    def get_project_list(self) -> list:
-        with Session(self.engine) as session:
-            projects = session.exec(select(Projects)).all()
-            return [project.project for project in projects]
-
-    def get_all_messages_formatted(self, project: str) -> list:
-        formatted_messages = []
-        with Session(self.engine) as session:
-            project_state = self._get_project(session, project)
-            if project_state:
-                message_stack = json.loads(project_state.message_stack_json)
-                for message in message_stack:
-                    formatted_messages.append(f"Devika: {message['message']}" if message['from_devika']
-                                              else f"User: {message['message']}")
-            return formatted_messages
-
-    def get_project_path(self, project: str) -> str:
-        return os.path.join(self.project_path, project.lower().replace(" ", "-"))
-
-    def project_to_zip(self, project: str) -> Optional[str]:
-        project_path = self.get_project_path(project)
-        zip_path = f"{project_path}.zip"
-
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(project_path):
-                for file in files:
-                    relative_path = os.path.relpath(os.path.join(root, file), os.path.join(project_path, '..'))
-                    zipf.write(os.path.join(root, file), arcname=relative_path)
-
-        return zip_path if os.path.exists(zip_path) else None
-
-    def get_zip_path(self, project: str) -> str:
-        return f"{self.get_project_path(project)}.zip"
+                key = self._merge_key(channel, content)
+                previous = self._pending.get(key) if key is not None else None
+                if previous is None:
+                    if len(self._pending) >= self.max_pending:
+                        self._make_room()
+                    if key is None or key in self._pending:
+                        key = (channel, next(self._unique_keys))
+                elif channel == "agent-state":
+                    # Keep the gap check working for clients: the merged delta follows
+                    # whatever the replaced one followed.
+                    content = dict(content, prev_seq=previous[1].get("prev_seq", previous[1]["seq"] - 1))
+                self._pending[key] = (channel, content, log)
+                if channel == "agent-state" and isinstance(content, dict) and "project_name" in content:
+                    mergeable = content.get("op") in ("append", "replace")
+                    self._latest_state[content["project_name"]] = (key, content["index"] if mergeable else None)
+
+            if self._oldest_at is None:
+                self._oldest_at = time.monotonic()
+                self._condition.notify()
+            elif len(self._pending) + len(self._screenshots) >= self.flush_size:
+                self._condition.notify()
+        return True
+
+    def _take_batch(self):
+        with self._condition:
+            while True:
+                if self._oldest_at is None:
+                    self._condition.wait()
+                    continue
+                remaining = self._oldest_at + self.coalesce_window - time.monotonic()
+                if remaining <= 0 or len(self._pending) + len(self._screenshots) >= self.flush_size:
+                    break
+                self._condition.wait(remaining)
+
+            batch = list(self._pending.values()) + list(self._screenshots)
+            self._pending.clear()
+            self._latest_state.clear()
+            self._screenshots.clear()
+            self._oldest_at = None
+            return batch
+
+    def _send_batch(self, batch):
+        for channel, content, log in batch:
+            try:
+                self.send(channel, content)
+                socket_events_total.inc(channel=channel)
+                if log:
+                    logger.info(f"SOCKET {channel} MESSAGE: {content}")
+            except Exception as e:
+                socket_send_errors_total.inc(channel=channel)
+                logger.error(f"SOCKET {channel} ERROR: {str(e)}")
+
+    def _run(self):
+        while True:
+            self._send_batch(self._take_batch())
+
+    def flush(self):
+        with self._condition:
+            batch = list(self._pending.values()) + list(self._screenshots)
+            self._pending.clear()
+            self._latest_state.clear()
+            self._screenshots.clear()
+            self._oldest_at = None
+        self._send_batch(batch)
+
+    def queue_depth(self) -> int:
+        with self._condition:
+            return len(self._pending) + len(self._screenshots)
+
+
+emitter = BufferedEmitter(socketio.emit)
+atexit.register(emitter.flush)
+registry.gauge("devika_socket_queue_depth", "Socket events waiting to be sent.").set_function(emitter.queue_depth)
+registry.gauge("devika_socket_events_dropped", "Socket events dropped because their queue was full.") \
+    .set_function(lambda: emitter.dropped)
+registry.gauge("devika_socket_events_collapsed", "Recoverable socket events replaced by snapshot markers.") \
+    .set_function(lambda: emitter.collapsed)
+
+
+def emit_agent(channel, content, log=True):
+    return emitter.emit(channel, content, log)
@@ -0,0 +1,118 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+class Stage:
+    """One step of a pipeline: `fn(**inputs)` produces the values named in `outputs`.
+
+    With a single output `fn` returns the value itself; with several it returns a tuple
+    in the declared order.
+    """
+
+    def __init__(self, name: str, fn: Callable, inputs: Sequence[str] = (), outputs: Sequence[str] = None):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs) if outputs is not None else (name,)
+
+
+class StageGraph:
+    """Runs stages as soon as their inputs exist, independent ones concurrently.
+
+    Every value has exactly one producer and stages only see their declared inputs, so
+    results do not depend on timing. `run` also returns a report with each stage's start
+    and end offset and the critical path: the chain of stages that bounded the run.
+    """
+
+    def __init__(self, stages: Iterable[Stage], initial: Iterable[str] = ()):
+        self.stages = list(stages)
+        producers = {name: None for name in initial}
+        for stage in self.stages:
+            for output in stage.outputs:
+                if output in producers:
+                    raise ValueError(f"Value {output!r} is produced twice")
+                producers[output] = stage.name
+        for stage in self.stages:
+            missing = [name for name in stage.inputs if name not in producers]
+            if missing:
+                raise ValueError(f"Stage {stage.name!r} needs {missing} which nothing produces")
+        self.producers = producers
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        done = {name for name, producer in self.producers.items() if producer is None}
+        remaining = list(self.stages)
+        while remaining:
+            ready = [stage for stage in remaining if all(name in done for name in stage.inputs)]
+            if not ready:
+                raise ValueError(f"Stages {[stage.name for stage in remaining]} form a cycle")
+            for stage in ready:
+                done.update(stage.outputs)
+                remaining.remove(stage)
+
+    def _dependencies(self, stage: Stage) -> List[str]:
+        return [self.producers[name] for name in stage.inputs if self.producers[name] is not None]
+
+    def run(self, initial: Dict[str, object], max_workers: int = 4,
+            between_stages: Optional[Callable[[], None]] = None) -> Tuple[Dict[str, object], dict]:
+        """Run all stages; `between_stages` is called in this thread after each one finishes."""
+        values = dict(initial)
+        pending = list(self.stages)
+        timings = {}
+        started = time.perf_counter()
+
+        def call(stage: Stage, inputs: dict):
+            stage_started = time.perf_counter()
+            result = stage.fn(**inputs)
+            return result, stage_started, time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage") as pool:
+            running = {}
+            try:
+                while pending or running:
+                    for stage in [stage for stage in pending if all(name in values for name in stage.inputs)]:
+                        pending.remove(stage)
+                        running[pool.submit(call, stage, {name: values[name] for name in stage.inputs})] = stage
+
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    # Apply completions in declaration order so `values` evolves the same way every run.
+                    for future in sorted(finished, key=lambda future: self.stages.index(running[future])):
+                        stage = running.pop(future)
+                        result, stage_started, stage_finished = future.result()
+                        outputs = (result,) if len(stage.outputs) == 1 else tuple(result)
+                        values.update(zip(stage.outputs, outputs))
+                        timings[stage.name] = (stage_started - started, stage_finished - started)
+                    if between_stages:
+                        between_stages()
+            except BaseException:
+                pending.clear()
+                for future in running:
+                    future.cancel()
+                raise
+
+        return values, self._report(timings, time.perf_counter() - started)
+
+    def _report(self, timings: Dict[str, Tuple[float, float]], total: float) -> dict:
+        by_name = {stage.name: stage for stage in self.stages}
+        path = []
+        current = max(timings, key=lambda name: timings[name][1]) if timings else None
+        while current is not None:
+            path.append(current)
+            dependencies = self._dependencies(by_name[current])
+            current = max(dependencies, key=lambda name: timings[name][1]) if dependencies else None
+        path.reverse()
+
+        return {
+            "total_ms": round(total * 1000, 1),
+            "stages": {
+                name: {
+                    "start_ms": round(start * 1000, 1),
+                    "end_ms": round(end * 1000, 1),
+                    "duration_ms": round((end - start) * 1000, 1)
+                }
+                for name, (start, end) in timings.items()
+            },
+            "critical_path": path,
+            "critical_path_ms": round(sum(timings[name][1] - timings[name][0] for name in path) * 1000, 1)
+        }
@@ -1,12 +1,27 @@
+import atexit
 import json
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Optional
-from sqlmodel import Field, Session, SQLModel, create_engine
-from src.socket_instance import emit_agent
+from sqlalchemy import Index
+from sqlmodel import Field, Session, SQLModel, select
+from src.socket_instance import emit_agent, socketio
 from src.config import Config
+from src.database import get_engine
 from src.logger import Logger
+from src.metrics import registry
+
+# Token usage is summed in memory and written to the latest state at most this often.
+TOKEN_FLUSH_INTERVAL = 5.0
+
+state_write_seconds = registry.histogram("devika_state_write_seconds", "Agent state DB write latency.", ("op",))
+tokens_total = registry.counter("devika_tokens_total", "Tokens reported through AgentState.update_token_usage.")
+
 
 class AgentStateModel(SQLModel, table=True):
+    # Legacy one-blob-per-project table, only read to migrate old databases.
     __tablename__ = "agent_state"
 
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -14,13 +29,53 @@ class AgentStateModel(SQLModel, table=True):
     state_stack_json: str
 
 
+class AgentStateEntry(SQLModel, table=True):
+    __tablename__ = "agent_state_entry"
+    __table_args__ = (Index("ix_agent_state_entry_project_seq", "project", "seq", unique=True),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    project: str
+    seq: int
+    state_json: str
+
+
+class AgentJobStatus(SQLModel, table=True):
+    __tablename__ = "agent_job_status"
+
+    job_id: str = Field(primary_key=True)
+    project: str = Field(index=True)
+    status_json: str
+
+
 class AgentState:
-    def __init__(self):
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        # One shared store per process; agents may call `AgentState()` freely.
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance._setup()
+                cls._instance = instance
+        return cls._instance
+
+    def _setup(self):
         self.config = Config()
-        sqlite_path = self.config.get_sqlite_db()
-        self.engine = create_engine(f"sqlite:///{sqlite_path}")
-        SQLModel.metadata.create_all(self.engine)
+        self.engine = get_engine(self.config.get_sqlite_db())
         self.logger = Logger()
+        self._event_seqs = {}
+        self._event_lock = threading.Lock()
+        self._project_locks = {}
+        self._project_locks_lock = threading.Lock()
+        self._pending_tokens = {}
+        self._tokens_lock = threading.Lock()
+        self._migrate_legacy_state()
+
+        self._token_flusher = threading.Thread(target=self._flush_tokens_periodically, name="token-flusher",
+                                               daemon=True)
+        self._token_flusher.start()
+        atexit.register(self.flush_token_usage)
 
     def new_state(self):
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -47,120 +102,374 @@ class AgentState:
     def _get_session(self) -> Session:
         return Session(self.engine)
 
-    def _get_agent_state(self, session: Session, project: str) -> Optional[AgentStateModel]:
-        return session.query(AgentStateModel).filter(AgentStateModel.project == project).first()
+    def _migrate_legacy_state(self):
+        """Split every legacy `state_stack_json` blob into one row per entry."""
+        with self._get_session() as session:
+            legacy_states = session.exec(select(AgentStateModel)).all()
+            for legacy_state in legacy_states:
+                if self._get_tail_entry(session, legacy_state.project) is None:
+                    for seq, state in enumerate(json.loads(legacy_state.state_stack_json)):
+                        session.add(AgentStateEntry(project=legacy_state.project, seq=seq,
+                                                    state_json=json.dumps(state)))
+                session.delete(legacy_state)
+            if legacy_states:
+                session.commit()
+                self.logger.info(f"Migrated agent state of {len(legacy_states)} project(s) to per-entry rows.")
 
-    def _update_agent_state(self, session: Session, agent_state: AgentStateModel, state_stack: list):
-        agent_state.state_stack_json = json.dumps(state_stack)
-        session.commit()
+    def _get_tail_entry(self, session: Session, project: str) -> Optional[AgentStateEntry]:
+        return session.exec(
+            select(AgentStateEntry)
+            .where(AgentStateEntry.project == project)
+            .order_by(AgentStateEntry.seq.desc())
+            .limit(1)
+        ).first()
 
-    def _emit_agent_state(self, state_stack: list):
-        emit_agent("agent-state", state_stack)
+    def _project_lock(self, project: str) -> threading.RLock:
+        """Serializes a project's tail reads, seq allocation, writes and delta emits.
 
-    def _get_latest_state(self, state_stack: list) -> Optional[dict]:
-        if state_stack:
-            return state_stack[-1]
-        return None
+        Holding it while emitting keeps the deltas of one project in commit order.
+        """
+        with self._project_locks_lock:
+            lock = self._project_locks.get(project)
+            if lock is None:
+                lock = self._project_locks[project] = threading.RLock()
+            return lock
 
-    def add_to_current_state(self, project: str, state: dict):
-        with self._get_session() as session:
-            agent_state = self._get_agent_state(session, project)
-            state_stack = json.loads(agent_state.state_stack_json) if agent_state else []
-            state_stack.append(state)
-            
-            if agent_state:
-                self._update_agent_state(session, agent_state, state_stack)
+    def _append_entry(self, session: Session, project: str, state: dict) -> AgentStateEntry:
+        # Callers hold the project lock, so no other writer can take the same seq.
+        tail = self._get_tail_entry(session, project)
+        entry = AgentStateEntry(project=project, seq=tail.seq + 1 if tail else 0, state_json=json.dumps(state))
+        session.add(entry)
+        with state_write_seconds.time(op="append"):
+            session.commit()
+        return entry
+
+    def _update_entry(self, session: Session, entry: AgentStateEntry, state: dict):
+        entry.state_json = json.dumps(state)
+        session.add(entry)
+        with state_write_seconds.time(op="update"):
+            session.commit()
+
+    def _patch_latest_state(self, project: str, patch: dict):
+        """Apply `patch` to the tail entry, or append a patched new state if there is none."""
+        with self._project_lock(project), self._get_session() as session:
+            tail = self._get_tail_entry(session, project)
+            if tail:
+                state = json.loads(tail.state_json)
+                state.update(patch)
+                self._update_entry(session, tail, state)
+                self._emit_agent_state(project, "replace", tail.seq, state)
             else:
-                agent_state = AgentStateModel(project=project, state_stack_json=json.dumps(state_stack))
-                session.add(agent_state)
+                state = self.new_state()
+                state.update(patch)
+                entry = self._append_entry(session, project, state)
+                self._emit_agent_state(project, "append", entry.seq, state)
+
+    def _next_event_seq(self, project: str) -> int:
+        with self._event_lock:
+            self._event_seqs[project] = self._event_seqs.get(project, 0) + 1
+            return self._event_seqs[project]
+
+    def _emit_agent_state(self, project: str, op: str, index: int, state: dict, pace_ms: Optional[int] = None):
+        """Emit a single-entry delta; `seq` increases by one per event so clients can detect gaps.
+
+        The socket emitter may merge deltas for the same entry, the merged one then carries
+        `prev_seq`, the seq it follows. `pace_ms` asks clients to space out their rendering.
+        """
+        delta = {
+            "project_name": project,
+            "seq": self._next_event_seq(project),
+            "op": op,
+            "index": index,
+            "state": state
+        }
+        if pace_ms:
+            delta["pace_ms"] = pace_ms
+        emit_agent("agent-state", delta)
+
+    def get_state_snapshot(self, project: str, since_index: int = 0) -> dict:
+        """Entries from `since_index` on, for clients that missed deltas.
+
+        Deltas with a `seq` greater than the returned one apply on top of the snapshot.
+        """
+        with self._project_lock(project), self._get_session() as session:
+            with self._event_lock:
+                seq = self._event_seqs.get(project, 0)
+            entries = session.exec(
+                select(AgentStateEntry)
+                .where(AgentStateEntry.project == project, AgentStateEntry.seq >= since_index)
+                .order_by(AgentStateEntry.seq)
+            ).all()
+            return {
+                "project_name": project,
+                "seq": seq,
+                "since_index": since_index,
+                "state_stack": [json.loads(entry.state_json) for entry in entries]
+            }
+
+    def add_to_current_state(self, project: str, state: dict) -> int:
+        """Append `state` and return its index in the stack."""
+        with self._project_lock(project), self._get_session() as session:
+            entry = self._append_entry(session, project, state)
+            self._emit_agent_state(project, "append", entry.seq, state)
+            return entry.seq
+
+    def patch_state(self, project: str, index: int, patch: dict):
+        """Apply `patch` to the entry at `index`, wherever it is in the stack."""
+        with self._project_lock(project), self._get_session() as session:
+            entry = session.exec(
+                select(AgentStateEntry).where(AgentStateEntry.project == project, AgentStateEntry.seq == index)
+            ).first()
+            if entry is None:
+                raise IndexError(f"No state entry {index} in project {project}")
+            state = json.loads(entry.state_json)
+            state.update(patch)
+            self._update_entry(session, entry, state)
+            self._emit_agent_state(project, "replace", index, state)
+
+    @contextmanager
+    def state_batch(self, project: str, pace_ms: Optional[int] = None):
+        """Append several states that stand or fall together.
+
+        Each state is stored and emitted as soon as it is appended, with "provisional"
+        set, so clients can show it while the batch is still open. Closing the batch
+        clears the flag with one "replace" delta per state; `discard()` or an exception
+        rolls the states back.
+        """
+        batch = StateBatch(self, project, pace_ms)
+        try:
+            yield batch
+        except BaseException:
+            batch.discard()
+            raise
+        self._confirm_states(project, batch.indexes)
+
+    def _append_provisional(self, project: str, state: dict, pace_ms: Optional[int]) -> int:
+        state = dict(state, provisional=True)
+        with self._project_lock(project), self._get_session() as session:
+            entry = self._append_entry(session, project, state)
+            self._emit_agent_state(project, "append", entry.seq, state, pace_ms)
+            return entry.seq
+
+    def _batch_entries(self, session: Session, project: str, indexes: list) -> list:
+        return session.exec(
+            select(AgentStateEntry)
+            .where(AgentStateEntry.project == project, AgentStateEntry.seq.in_(indexes))
+            .order_by(AgentStateEntry.seq)
+        ).all()
+
+    def _confirm_states(self, project: str, indexes: list):
+        if not indexes:
+            return
+        with self._project_lock(project), self._get_session() as session:
+            confirmed = []
+            for entry in self._batch_entries(session, project, indexes):
+                state = json.loads(entry.state_json)
+                state.pop("provisional", None)
+                entry.state_json = json.dumps(state)
+                session.add(entry)
+                confirmed.append((entry.seq, state))
+            with state_write_seconds.time(op="batch"):
+                session.commit()
+            for seq, state in confirmed:
+                self._emit_agent_state(project, "replace", seq, state)
+
+    def _roll_back_states(self, project: str, indexes: list):
+        """Remove provisional entries, or mark them discarded if newer entries follow them.
+
+        Removal emits one "rollback" delta that truncates the client's stack at the first
+        removed index, so indexes stay equal to seqs.
+        """
+        with self._project_lock(project), self._get_session() as session:
+            entries = self._batch_entries(session, project, indexes)
+            if not entries:
+                return
+            tail = self._get_tail_entry(session, project)
+            first = entries[0].seq
+            if tail.seq == entries[-1].seq and [entry.seq for entry in entries] == list(range(first, tail.seq + 1)):
+                for entry in entries:
+                    session.delete(entry)
+                with state_write_seconds.time(op="rollback"):
+                    session.commit()
+                self._emit_agent_state(project, "rollback", first, None)
+                return
+
+            discarded = []
+            for entry in entries:
+                state = json.loads(entry.state_json)
+                state.pop("provisional", None)
+                state["discarded"] = True
+                entry.state_json = json.dumps(state)
+                session.add(entry)
+                discarded.append((entry.seq, state))
+            with state_write_seconds.time(op="rollback"):
                 session.commit()
-            
-            self._emit_agent_state(state_stack)
+            for seq, state in discarded:
+                self._emit_agent_state(project, "replace", seq, state)
 
     def get_current_state(self, project: str) -> Optional[list]:
         with self._get_session() as session:
-            agent_state = self._get_agent_state(session, project)
-            if agent_state:
-                return json.loads(agent_state.state_stack_json)
+            entries = session.exec(
+                select(AgentStateEntry)
+                .where(AgentStateEntry.project == project)
+                .order_by(AgentStateEntry.seq)
+            ).all()
+            if entries:
+                return [json.loads(entry.state_json) for entry in entries]
             return None
 
-    def update_latest_state(self, project: str, state: dict):
+    def get_latest_state(self, project: str) -> Optional[dict]:
         with self._get_session() as session:
-            agent_state = self._get_agent_state(session, project)
-            if agent_state:
-                state_stack = json.loads(agent_state.state_stack_json)
-                state_stack[-1] = state
-                self._update_agent_state(session, agent_state, state_stack)
+            tail = self._get_tail_entry(session, project)
+            if tail:
+                return json.loads(tail.state_json)
+            return None
+
+    def update_latest_state(self, project: str, state: dict):
+        with self._project_lock(project), self._get_session() as session:
+            tail = self._get_tail_entry(session, project)
+            if tail:
+                self._update_entry(session, tail, state)
+                self._emit_agent_state(project, "replace", tail.seq, state)
             else:
-                state_stack = [state]
-                agent_state = AgentStateModel(project=project, state_stack_json=json.dumps(state_stack))
-                session.add(agent_state)
-                session.commit()
-            self._emit_agent_state(state_stack)
-            
+                entry = self._append_entry(session, project, state)
+                self._emit_agent_state(project, "append", entry.seq, state)
 
     def set_agent_active(self, project: str, is_active: bool):
-        with self._get_session() as session:
-            agent_state = self._get_agent_state(session, project)
-            if agent_state:
-                state_stack = json.loads(agent_state.state_stack_json)
-                state_stack[-1]["agent_is_active"] = is_active
-                self._update_agent_state(session, agent_state, state_stack)
-            else:
-                state_stack = [self.new_state()]
-                state_stack[-1]["agent_is_active"] = is_active
-                agent_state = AgentStateModel(project=project, state_stack_json=json.dumps(state_stack))
-                session.add(agent_state)
-                session.commit()
-            self._emit_agent_state(state_stack)
+        self._patch_latest_state(project, {"agent_is_active": is_active})
 
     def is_agent_active(self, project: str) -> Optional[bool]:
-        with self._get_session() as session:
-            agent_state = self._get_agent_state(session, project)
-            if agent_state:
-                return json.loads(agent_state.state_stack_json)[-1]["agent_is_active"]
-            return None
+        state = self.get_latest_state(project)
+        if state:
+            return state["agent_is_active"]
+        return None
 
     def set_agent_completed(self, project: str, is_completed: bool):
+        self._patch_latest_state(project, {"internal_monologue": "Agent has completed the task.",
+                                           "completed": is_completed})
+
+    def is_agent_completed(self, project: str) -> Optional[bool]:
+        state = self.get_latest_state(project)
+        if state:
+            return state["completed"]
+        return None
+
+    def set_job_status(self, project: str, job_status: dict):
+        """Store the status of one scheduler job, keyed by its id, and emit it."""
         with self._get_session() as session:
-            agent_state = self._get_agent_state(session, project)
-            if agent_state:
-                state_stack = json.loads(agent_state.state_stack_json)
-                state_stack[-1]["internal_monologue"] = "Agent has completed the task."
-                state_stack[-1]["completed"] = is_completed
-                self._update_agent_state(session, agent_state, state_stack)
+            row = session.get(AgentJobStatus, job_status["id"])
+            if row is None:
+                row = AgentJobStatus(job_id=job_status["id"], project=project, status_json=json.dumps(job_status))
             else:
-                state_stack = [self.new_state()]
-                state_stack[-1]["completed"] = is_completed
-                agent_state = AgentStateModel(project=project, state_stack_json=json.dumps(state_stack))
-                session.add(agent_state)
+                row.status_json = json.dumps(job_status)
+            session.add(row)
+            with state_write_seconds.time(op="job"):
                 session.commit()
-            self._emit_agent_state(state_stack)
+        emit_agent("job-status", dict(job_status, project_name=project))
 
-    def is_agent_completed(self, project: str) -> Optional[bool]:
+    def get_job_status(self, job_id: str) -> Optional[dict]:
         with self._get_session() as session:
-            agent_state = self._get_agent_state(session, project)
-            if agent_state:
-                return json.loads(agent_state.state_stack_json)[-1]["completed"]
+            row = session.get(AgentJobStatus, job_id)
+            if row:
+                return json.loads(row.status_json)
             return None
 
-    def update_token_usage(self, project: str, token_usage: int):
+    def get_job_statuses(self, project: str) -> list:
         with self._get_session() as session:
-            agent_state = self._get_agent_state(session, project)
-            if agent_state:
-                state_stack = json.loads(agent_state.state_stack_json)
-                state_stack[-1]["token_usage"] += token_usage
-                self._update_agent_state(session, agent_state, state_stack)
+            rows = session.exec(select(AgentJobStatus).where(AgentJobStatus.project == project)).all()
+            return [json.loads(row.status_json) for row in rows]
+
+    def update_token_usage(self, project: str, token_usage: int):
+        """Count tokens in memory; they reach the state at the next periodic flush."""
+        tokens_total.inc(token_usage)
+        with self._tokens_lock:
+            self._pending_tokens[project] = self._pending_tokens.get(project, 0) + token_usage
+
+    def _flush_tokens_periodically(self):
+        while True:
+            time.sleep(TOKEN_FLUSH_INTERVAL)
+            try:
+                self.flush_token_usage()
+            except Exception as e:
+                self.logger.error(f"Could not flush token usage: {e}")
+
+    def flush_token_usage(self):
+        with self._tokens_lock:
+            pending, self._pending_tokens = self._pending_tokens, {}
+        failed = {}
+        error = None
+        for project, token_usage in pending.items():
+            try:
+                self._write_token_usage(project, token_usage)
+            except Exception as e:
+                failed[project] = token_usage
+                error = error or e
+        if failed:
+            # Keep the tokens of failed projects for the next flush.
+            with self._tokens_lock:
+                for project, token_usage in failed.items():
+                    self._pending_tokens[project] = self._pending_tokens.get(project, 0) + token_usage
+            raise error
+
+    def _write_token_usage(self, project: str, token_usage: int):
+        with self._project_lock(project), self._get_session() as session:
+            tail = self._get_tail_entry(session, project)
+            if tail:
+                state = json.loads(tail.state_json)
+                state["token_usage"] += token_usage
+                self._update_entry(session, tail, state)
             else:
-                state_stack = [self.new_state()]
-                state_stack[-1]["token_usage"] = token_usage
-                agent_state = AgentStateModel(project=project, state_stack_json=json.dumps(state_stack))
-                session.add(agent_state)
-                session.commit()
+                state = self.new_state()
+                state["token_usage"] = token_usage
+                self._append_entry(session, project, state)
 
     def get_latest_token_usage(self, project: str) -> int:
-        with self._get_session() as session:
-            agent_state = self._get_agent_state(session, project)
-            if agent_state:
-                return json.loads(agent_state.state_stack_json)[-1]["token_usage"]
-            return 0
+        with self._tokens_lock:
+            pending = self._pending_tokens.get(project, 0)
+        state = self.get_latest_state(project)
+        if state:
+            return state["token_usage"] + pending
+        return pending
+
+
+class StateBatch:
+    """Provisional states appended through `AgentState.state_batch`."""
+
+    def __init__(self, store: AgentState, project: str, pace_ms: Optional[int] = None):
+        self.store = store
+        self.project = project
+        self.pace_ms = pace_ms
+        self.indexes = []
+
+    def append(self, state: dict) -> int:
+        index = self.store._append_provisional(self.project, state, self.pace_ms)
+        self.indexes.append(index)
+        return index
+
+    def discard(self):
+        if self.indexes:
+            self.store._roll_back_states(self.project, self.indexes)
+        self.indexes = []
+
+
+@socketio.on("agent-state-snapshot")
+def handle_state_snapshot_request(data: dict) -> dict:
+    """Answer a client that detected a gap in the "agent-state" deltas with a snapshot."""
+    return AgentState().get_state_snapshot(data["project_name"], data.get("since_index", 0))
+
+
+def apply_state_delta(state_stack: list, delta: dict) -> list:
+    """Apply an "agent-state" delta to a client-side copy of the state stack."""
+    index = delta["index"]
+    if delta.get("op") == "snapshot":
+        raise ValueError(f"Deltas from index {index} were collapsed, request a snapshot")
+    if delta.get("op") == "rollback":
+        del state_stack[index:]
+        return state_stack
+    if index > len(state_stack):
+        raise ValueError(f"Missing state entries before index {index}, request a snapshot")
+    if index < len(state_stack):
+        state_stack[index] = delta["state"]
+    else:
+        state_stack.append(delta["state"])
+    return state_stack
@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("flask_socketio")
+pytest.importorskip("playwright")
+
+from src.browser.pool import BrowserPool, PooledPage
+from src.research import EventLoopThread
+
+
+class FakePage:
+    def __init__(self):
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+
+class FakeContext:
+    def __init__(self, page):
+        self.page = page
+
+    async def close(self):
+        await asyncio.sleep(0)
+        self.page.closed = True
+
+
+def idle_page(age):
+    page = FakePage()
+    pooled = PooledPage(FakeContext(page), page)
+    pooled.last_used = time.monotonic() - age
+    return pooled
+
+
+def test_reaper_closes_idle_pages_without_a_checkout(monkeypatch):
+    monkeypatch.setattr("atexit.register", lambda function: None)
+    loop_thread = EventLoopThread()
+    pool = BrowserPool(idle_timeout=1, reap_interval=0.05)
+    stale, fresh = idle_page(age=5), idle_page(age=0)
+    pool._idle = [stale, fresh]
+
+    pool.start(loop_thread.loop)
+    time.sleep(0.3)
+
+    assert stale.page.closed and pool._idle == [fresh]
+    pool.shutdown()
+    assert fresh.page.closed and pool._idle == [] and pool._reaper is None
+
+
+def test_reaping_keeps_pages_checked_out_meanwhile():
+    pool = BrowserPool(idle_timeout=1)
+    stale, fresh = idle_page(age=5), idle_page(age=0)
+    pool._idle = [fresh, stale]
+
+    async def reap_and_checkout():
+        reaping = asyncio.ensure_future(pool._reap_idle())
+        await asyncio.sleep(0)
+        taken = pool._idle.pop()
+        await reaping
+        return taken
+
+    assert asyncio.run(reap_and_checkout()) is fresh
+    assert pool._idle == []
+
+
+def test_release_after_shutdown_closes_the_page():
+    pool = BrowserPool()
+    pooled = idle_page(age=0)
+
+    async def release_after_close():
+        # The page was checked out while the browser was up, then the pool shut down.
+        pool._slots = asyncio.Semaphore(0)
+        await pool.close()
+        await pool.release(pooled)
+
+    asyncio.run(release_after_close())
+
+    assert pooled.page.closed and pool._idle == []
@@ -0,0 +1,34 @@
+import pytest
+
+from src.code_parser import CodeParseError, FilesStreamParser, parse_files
+
+
+def stream_parse(response, chunk_chars=7):
+    parser = FilesStreamParser()
+    files = []
+    for start in range(0, len(response), chunk_chars):
+        files += parser.feed(response[start:start + chunk_chars])
+    return files + parser.close()
+
+
+@pytest.mark.parametrize("item", ['{"file": 1, "code": "x"}', '{"file": "a.py", "code": ["x"]}'])
+def test_non_string_file_or_code_is_rejected(item):
+    response = f"~~~\n[{item}]\n~~~"
+
+    for parse in (parse_files, stream_parse):
+        with pytest.raises(CodeParseError):
+            parse(response)
+
+
+@pytest.mark.parametrize("response", [
+    "# Résumé ✓\n~~~\nFile: `a.py`:\n```\nprint('é')\n```\n```\n~~~",
+    "# Résumé ✓\n~~~\nFile: `a.py`:\n```\nprint('é')\n",
+    '# Résumé ✓\n~~~\n[{"file": "é.py", "code": "x"}, x]\n~~~',
+    '# Résumé ✓\n~~~\n[{"file": "é.py", "code": "x"}, {"file": "b.py", "code": 2}]\n~~~',
+])
+def test_stream_errors_report_utf8_byte_offsets(response):
+    with pytest.raises(CodeParseError) as error:
+        stream_parse(response)
+
+    assert error.value.offset > 0
+    assert error.value.byte_offset == len(response[:error.value.offset].encode("utf-8"))
@@ -0,0 +1,74 @@
+import pytest
+
+pytest.importorskip("flask_socketio")
+
+from src import context as context_module
+from src.context import CONVERSATION_SHARE, ContextBuilder
+
+
+class WordTokenizer:
+    """One token per word, so budgets are easy to count."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, text):
+        self.encoded.append(text)
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+class StaticSnapshotIndex:
+    def __init__(self, entries):
+        self.entries = entries
+
+    def get_entries(self, project_name):
+        return self.entries
+
+
+def message(message_id, text, from_devika=False):
+    return {"id": message_id, "from_devika": from_devika, "message": text, "timestamp": ""}
+
+
+def file_entry(path, words):
+    return {"path": path, "sha256": path, "mtime_ns": 0, "markdown": " ".join(["code"] * words)}
+
+
+@pytest.fixture
+def builder(monkeypatch):
+    files = [file_entry("a.py", 30), file_entry("b.py", 30)]
+    monkeypatch.setattr(context_module, "ProjectSnapshotIndex", lambda: StaticSnapshotIndex(files))
+    return ContextBuilder(WordTokenizer(), budgets={"answer": 100})
+
+
+def test_recent_messages_stay_within_the_conversation_share(builder):
+    share = int(100 * CONVERSATION_SHARE)
+    messages = [message(1, "word " * 50), message(2, "word " * 50)]
+
+    conversation, code_markdown = builder.build("answer", "demo", "prompt", messages)
+
+    assert sum(len(text.split()) for text in conversation) <= share
+    # The newest message is cut to fit; the one before it no longer fits at all.
+    assert conversation == [" ".join(["User:"] + ["word"] * (share - 1))]
+    assert code_markdown.count("code") == 60
+
+
+def test_relevant_older_messages_fill_the_rest_of_the_share(builder):
+    messages = [message(1, "about the parser bug"), message(2, "unrelated chatter here"),
+                message(3, "ok", from_devika=True), message(4, "thanks")]
+
+    conversation, _ = builder.select_messages(messages, {"parser"}, budget=10)
+
+    assert conversation == ["User: about the parser bug", "Devika: ok", "User: thanks"]
+
+
+def test_message_tokens_are_cached_by_id(builder):
+    messages = [message(1, "first message"), message(2, "second message")]
+
+    builder.build_conversation("answer", "prompt", messages)
+    builder.build("answer", "demo", "prompt", messages)
+
+    counted = [text for text in builder.tokenizer.encoded if text.startswith("User:")]
+    assert counted == ["User: first message", "User: second message"]
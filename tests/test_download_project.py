@@ -0,0 +1,63 @@
+import io
+import zipfile
+
+import pytest
+
+pytest.importorskip("flask_socketio")
+
+from src.database import get_engine
+from src.filesystem.archive import ZipExporter
+from src.filesystem.writer import ProjectWriter
+from src.logger import app
+from src.project import ProjectManager
+
+
+@pytest.fixture
+def projects(tmp_path, monkeypatch):
+    projects_dir = tmp_path / "projects"
+    (projects_dir / "demo-app").mkdir(parents=True)
+    (projects_dir / "demo-app" / "main.py").write_text("print('hi')\n")
+    (tmp_path / "secret").mkdir()
+    (tmp_path / "secret" / "key.txt").write_text("hunter2\n")
+
+    project_manager = object.__new__(ProjectManager)
+    project_manager.project_path = str(projects_dir)
+    project_manager.engine = get_engine(str(tmp_path / "devika.db"))
+    project_manager.zip_exporter = ZipExporter()
+    monkeypatch.setattr(ProjectManager, "_instance", project_manager)
+    project_manager.create_project("Demo App")
+    return tmp_path
+
+
+def download(project_name):
+    return app.test_client().get("/api/download-project", query_string={"project_name": project_name})
+
+
+def test_download_streams_the_project(projects):
+    response = download("Demo App")
+
+    assert response.status_code == 200
+    assert zipfile.ZipFile(io.BytesIO(response.data)).namelist() == ["demo-app/main.py"]
+    assert (projects / "projects" / "demo-app.zip").exists()
+
+
+@pytest.mark.parametrize("project_name", ["../secret", "unknown", "Demo App/../../secret"])
+def test_unknown_or_escaping_projects_are_not_found(projects, project_name):
+    ProjectManager().create_project("../secret")
+
+    response = download(project_name)
+
+    assert response.status_code == 404
+    assert sorted(path.name for path in projects.rglob("*.zip*")) == []
+
+
+def test_staging_files_left_by_a_crash_are_skipped_and_swept(projects):
+    project_path = projects / "projects" / "demo-app"
+    stale = project_path / ".main.py.999999.0.tmp"
+    stale.write_text("half written")
+
+    response = download("Demo App")
+    assert zipfile.ZipFile(io.BytesIO(response.data)).namelist() == ["demo-app/main.py"]
+
+    ProjectWriter(str(project_path)).discard()
+    assert not stale.exists() and (project_path / "main.py").exists()
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.research import EventLoopThread, ResearchPipeline
+
+PAGE_DELAY = 0.1
+SEARCH_DELAY = 0.05
+QUERIES = [f"Query {number}" for number in range(8)]
+
+
+class SlowPageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(PAGE_DELAY)
+        body = f"page for {self.path.strip('/')}".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def page_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowPageHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture(scope="module")
+def research_loop():
+    return EventLoopThread()
+
+
+class StandInSearch:
+    """Blocking search engine like the real ones: `search`, then `get_first_link`."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.link = None
+
+    def search(self, query: str):
+        time.sleep(SEARCH_DELAY)
+        self.link = f"{self.base_url}/{query.replace(' ', '-')}"
+
+    def get_first_link(self) -> str:
+        return self.link
+
+
+def run_pipeline(page_server: str, research_loop: EventLoopThread, concurrency: int):
+    async def open_page(project_name: str, url: str):
+        with await asyncio.to_thread(urllib.request.urlopen, url) as response:
+            return b"", response.read().decode("utf-8")
+
+    pipeline = ResearchPipeline(
+        new_search=lambda: StandInSearch(page_server),
+        open_page=open_page,
+        format_text=lambda text, project_name: text.upper(),
+        concurrency=concurrency
+    )
+    started = time.perf_counter()
+    results = research_loop.run(pipeline.run(QUERIES, "research-test"))
+    return results, time.perf_counter() - started, pipeline.timings
+
+
+def test_results_keep_query_order(page_server, research_loop):
+    results, _, timings = run_pipeline(page_server, research_loop, concurrency=4)
+
+    assert list(results) == [query.lower() for query in QUERIES]
+    assert list(results.values()) == [f"page for {query.lower().replace(' ', '-')}".upper() for query in QUERIES]
+    assert all(set(stages) == {"search", "fetch", "format"} for stages in timings.values())
+
+
+def test_wall_time_scales_with_concurrency(page_server, research_loop):
+    _, serial, _ = run_pipeline(page_server, research_loop, concurrency=1)
+    _, parallel, _ = run_pipeline(page_server, research_loop, concurrency=4)
+
+    # 8 queries of ~0.15s each: ~1.2s one at a time, ~0.3s four at a time.
+    assert serial >= len(QUERIES) * (PAGE_DELAY + SEARCH_DELAY)
+    assert parallel < serial / 2.5
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+pytest.importorskip("flask_socketio")
+
+from src.socket_instance import BufferedEmitter
+
+
+@pytest.fixture
+def emitter():
+    sent = []
+    # A long coalesce window keeps the worker from sending, so the queue fills up.
+    emitter = BufferedEmitter(lambda channel, content: sent.append((channel, content)),
+                              coalesce_window=60, max_pending=4, max_screenshots=2)
+    return emitter, sent
+
+
+def delta(project, seq, index=None, op="append"):
+    index = seq - 1 if index is None else index
+    return {"project_name": project, "seq": seq, "op": op, "index": index, "state": {"step": seq}}
+
+
+def message(project, message_id):
+    return {"messages": {"id": message_id, "message": f"message {message_id}"}, "project_name": project}
+
+
+def sent_states(sent):
+    return [content for channel, content in sent if channel == "agent-state"]
+
+
+def assert_in_order(states, last_seq):
+    expected_prev = 0
+    for content in states:
+        assert content.get("prev_seq", content["seq"] - 1) == expected_prev
+        expected_prev = content["seq"]
+    assert expected_prev == last_seq
+
+
+def test_only_the_latest_delta_of_a_project_absorbs_a_replace(emitter):
+    emitter, sent = emitter
+    emitter.emit("agent-state", delta("demo", 1))
+    emitter.emit("agent-state", delta("demo", 2))
+    emitter.emit("agent-state", delta("demo", 3, index=0, op="replace"))
+    emitter.emit("agent-state", delta("demo", 4, index=0, op="replace"))
+    emitter.flush()
+
+    states = sent_states(sent)
+    # seq 3 may not jump ahead of seq 2; seq 4 merges into seq 3, the latest pending delta.
+    assert [content["seq"] for content in states] == [1, 2, 4]
+    assert_in_order(states, 4)
+
+
+def test_overflow_collapses_state_deltas_into_a_snapshot_marker(emitter):
+    emitter, sent = emitter
+    emitter.emit("server-message", message("demo", 1))
+    for seq in range(1, 9):
+        emitter.emit("agent-state", delta("demo", seq))
+    emitter.flush()
+
+    assert ("server-message", message("demo", 1)) in sent
+    states = sent_states(sent)
+    assert any(content["op"] == "snapshot" for content in states) and emitter.collapsed > 0
+    # Together the marker and the remaining deltas still cover every seq without a gap.
+    assert_in_order(states, 8)
+
+
+def test_overflow_collapses_messages_and_never_blocks(emitter):
+    emitter, sent = emitter
+    started = time.monotonic()
+    for message_id in range(1, 9):
+        emitter.emit("server-message", message("demo", message_id))
+    for frame in range(5):
+        emitter.emit("screenshot", {"data": frame})
+    assert time.monotonic() - started < 0.05
+    assert emitter.queue_depth() <= 4 + 2
+    emitter.flush()
+
+    messages = [content for channel, content in sent if channel == "server-message"]
+    markers = [content for content in messages if content.get("op") == "snapshot"]
+    delivered = {content["messages"]["id"] for content in messages if "messages" in content}
+    # Every message is either delivered or covered by a marker the client refetches from.
+    assert markers and all(message_id in delivered or message_id > min(marker["after"] for marker in markers)
+                           for message_id in range(1, 9))
+    assert [content["data"] for channel, content in sent if channel == "screenshot"] == [3, 4]
+
+
+def test_overflow_drops_the_oldest_unrecoverable_event(emitter):
+    emitter, sent = emitter
+    for number in range(6):
+        emitter.emit("info", {"number": number})
+    emitter.flush()
+
+    assert [content["number"] for _, content in sent] == [2, 3, 4, 5]
+    assert emitter.dropped == 2
@@ -0,0 +1,143 @@
+import pytest
+
+pytest.importorskip("flask_socketio")
+
+from src import state as state_module
+from src.config import Config
+from src.logger import app
+from src.socket_instance import BufferedEmitter
+from src.state import AgentState, apply_state_delta, handle_state_snapshot_request
+
+
+@pytest.fixture
+def agent_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "get_sqlite_db", lambda self: str(tmp_path / "devika.db"), raising=False)
+    monkeypatch.setattr(AgentState, "_instance", None)
+
+    sent = []
+    # Everything emitted before `deltas()` is coalesced in one window, then sent in order.
+    emitter = BufferedEmitter(lambda channel, content: sent.append((channel, content)), coalesce_window=60)
+    monkeypatch.setattr(state_module, "emit_agent", emitter.emit)
+
+    def deltas():
+        emitter.flush()
+        return [content for channel, content in sent if channel == "agent-state"]
+
+    return AgentState(), deltas
+
+
+def fold(deltas, state_stack=None, after_seq=0):
+    """Apply deltas in arrival order, as a client does, checking that none is missing."""
+    state_stack = list(state_stack or [])
+    expected_prev = after_seq
+    for delta in deltas:
+        if delta["seq"] <= after_seq:
+            continue
+        # A coalesced delta replaces the ones it swallowed and says which seq it follows.
+        assert delta.get("prev_seq", delta["seq"] - 1) == expected_prev
+        apply_state_delta(state_stack, delta)
+        expected_prev = delta["seq"]
+    return state_stack
+
+
+def write_session(store: AgentState, project: str, steps: int):
+    for step in range(steps):
+        state = store.new_state()
+        state["step"] = step
+        index = store.add_to_current_state(project, state)
+        store.set_agent_active(project, step % 2 == 0)
+        store.patch_state(project, index, {"message": f"step {step}"})
+    with store.state_batch(project) as batch:
+        for file_number in range(3):
+            state = store.new_state()
+            state["terminal_session"]["title"] = f"Editing file {file_number}"
+            batch.append(state)
+    store.update_latest_state(project, dict(store.get_latest_state(project), completed=True))
+
+
+def test_deltas_replay_to_the_stored_stack(agent_state):
+    store, deltas = agent_state
+    write_session(store, "replay", steps=5)
+
+    assert fold(deltas()) == store.get_current_state("replay")
+
+
+def test_replace_of_an_earlier_entry_then_append_in_one_window(agent_state):
+    store, deltas = agent_state
+    first = store.add_to_current_state("window", store.new_state())
+    store.add_to_current_state("window", store.new_state())
+    store.patch_state("window", first, {"message": "edited"})
+    store.add_to_current_state("window", store.new_state())
+    store.patch_state("window", first, {"message": "edited again"})
+
+    assert fold(deltas()) == store.get_current_state("window")
+
+
+def test_batch_states_are_emitted_before_the_batch_closes(agent_state):
+    store, deltas = agent_state
+    with store.state_batch("live") as batch:
+        batch.append(store.new_state())
+        assert deltas()[-1]["op"] == "append" and deltas()[-1]["state"]["provisional"]
+
+    state_stack = store.get_current_state("live")
+    assert "provisional" not in state_stack[-1]
+    assert fold(deltas()) == state_stack
+
+
+def test_failed_batch_is_rolled_back(agent_state):
+    store, deltas = agent_state
+    write_session(store, "rollback", steps=2)
+    before = store.get_current_state("rollback")
+
+    with pytest.raises(RuntimeError):
+        with store.state_batch("rollback") as batch:
+            batch.append(store.new_state())
+            batch.append(store.new_state())
+            raise RuntimeError("model stream aborted")
+
+    assert deltas()[-1]["op"] == "rollback"
+    assert fold(deltas()) == store.get_current_state("rollback") == before
+
+
+def test_discarded_batch_followed_by_other_states_is_marked_discarded(agent_state):
+    store, deltas = agent_state
+    with store.state_batch("interleaved") as batch:
+        batch.append(store.new_state())
+        store.add_to_current_state("interleaved", store.new_state())
+        batch.discard()
+
+    state_stack = store.get_current_state("interleaved")
+    assert state_stack[0]["discarded"] and "provisional" not in state_stack[0]
+    assert fold(deltas()) == state_stack
+
+
+def test_snapshot_plus_later_deltas_replay_to_the_stored_stack(agent_state):
+    store, deltas = agent_state
+    write_session(store, "catch-up", steps=3)
+    snapshot = store.get_state_snapshot("catch-up")
+    write_session(store, "catch-up", steps=3)
+
+    state_stack = fold(deltas(), snapshot["state_stack"], after_seq=snapshot["seq"])
+    assert state_stack == store.get_current_state("catch-up")
+
+
+def test_snapshot_route(agent_state):
+    store, _ = agent_state
+    write_session(store, "route", steps=2)
+
+    response = app.test_client().get("/api/agent-state-snapshot",
+                                     query_string={"project_name": "route", "since_index": 1})
+
+    assert response.status_code == 200
+    assert response.get_json()["state_stack"] == store.get_current_state("route")[1:]
+    assert app.test_client().get("/api/agent-state-snapshot").status_code == 400
+
+
+def test_snapshot_socket_handler(agent_state):
+    store, _ = agent_state
+    write_session(store, "socket", steps=2)
+
+    snapshot = handle_state_snapshot_request({"project_name": "socket"})
+
+    assert snapshot["state_stack"] == store.get_current_state("socket")
+    assert snapshot["since_index"] == 0